@@ -0,0 +1,353 @@
+"""
+Management command for load testing of a running API server.
+
+Worker threads replay weighted scenarios of the frontend: browsing recipes
+with tag filters, opening a recipe, ingredient autocomplete, toggling
+favorites and shopping cart, subscriptions page and shopping list download.
+Authenticated scenarios log in as users made by generate_data command. The
+command reports throughput, latency percentiles and errors for every route
+and hit rates of server caches taken from the Server-Timing header.
+"""
+
+import http.client
+import json
+import math
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+
+from recipes.management.commands.generate_data import (DEFAULT_PASSWORD,
+                                                       USERNAME_PREFIX)
+
+# Scenario method name and its weight in the traffic mix.
+SCENARIOS = {
+    'browse_recipes': 40,
+    'open_recipe': 15,
+    'search_ingredients': 15,
+    'toggle_favorite': 10,
+    'toggle_shopping_cart': 8,
+    'browse_subscriptions': 7,
+    'download_shopping_list': 5,
+}
+PERCENTILES = (50, 90, 99)
+PAGE_LIMIT = 6
+RECIPES_LIMIT = 3
+CACHE_METRIC_RE = re.compile(r'cache-([\w-]+);desc="hits=(\d+) misses=(\d+)"')
+
+
+class Command(BaseCommand):
+    help = _('Replays weighted scenarios of the frontend against a running '
+             'server and reports throughput, latency and errors per route')
+    messages = {
+        'running': _('Running {} workers for {:.0f} sec...'),
+        'login_error': _('Can not log in as test users, run generate_data '
+                         'command on the server database first.'),
+        'no_data': _('There are no recipes or ingredients.'),
+        'no_cache_metrics': _('No cache metrics in Server-Timing, check '
+                              'SERVER_TIMING_SAMPLE_RATE of the server.'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://localhost:8000',
+            help=_('Base URL of the server.'),
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help=_('Duration of the test in seconds.'),
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help=_('Number of worker threads.'),
+        )
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help=_('Number of users made by generate_data to log in as.'),
+        )
+        parser.add_argument(
+            '--password', default=DEFAULT_PASSWORD,
+            help=_('Password of the users.'),
+        )
+        parser.add_argument(
+            '--anonymous-share', type=float, default=0.3,
+            help=_('Share of browsing scenarios made by anonymous users.'),
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help=_('Seed of the random generator.'),
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        client = HttpClient(url.hostname, url.port, url.scheme == 'https')
+        context = self.prepare_context(client, options)
+        self.stdout.write(self.messages.get('running').format(
+            options['concurrency'], options['duration']
+        ))
+        deadline = time.monotonic() + options['duration']
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            workers = [
+                pool.submit(
+                    LoadWorker(url, context, options, number).run, deadline
+                )
+                for number in range(options['concurrency'])
+            ]
+            results = [worker.result() for worker in workers]
+        self.write_report([samples for samples, _ in results],
+                          time.monotonic() - start)
+        self.write_cache_report([counts for _, counts in results])
+
+    def prepare_context(self, client, options):
+        """
+        Log in as test users and load tags, recipe ids and ingredient names
+         used by scenarios.
+        """
+        tokens = []
+        for number in range(options['users']):
+            status, body, _ = client.request(
+                'POST', '/api/auth/token/login/', {
+                    'email': f'{USERNAME_PREFIX}{number}@foodgram.ru',
+                    'password': options['password'],
+                }
+            )
+            if status == 200:
+                tokens.append(json.loads(body)['auth_token'])
+        if not tokens:
+            raise CommandError(self.messages.get('login_error'))
+        status, body, _ = client.request('GET', '/api/tags/')
+        tags = [tag['slug'] for tag in json.loads(body)]
+        status, body, _ = client.request(
+            'GET', '/api/recipes/?' + urlencode({'limit': 100})
+        )
+        recipes = json.loads(body)
+        recipe_ids = [recipe['id'] for recipe in recipes['results']]
+        status, body, _ = client.request('GET', '/api/ingredients/')
+        prefixes = sorted({
+            ingredient['name'][:length]
+            for ingredient in json.loads(body)
+            for length in (1, 2, 3)
+        })
+        if not recipe_ids or not prefixes:
+            raise CommandError(self.messages.get('no_data'))
+        return {
+            'tokens': tokens,
+            'tags': tags,
+            'recipe_ids': recipe_ids,
+            'prefixes': prefixes,
+        }
+
+    def write_report(self, samples, duration):
+        """Write throughput, latency percentiles and errors per route."""
+        routes = defaultdict(list)
+        for worker_samples in samples:
+            for route, latency, ok in worker_samples:
+                routes[route].append((latency, ok))
+        routes['total'] = [
+            sample for route in sorted(routes) for sample in routes[route]
+        ]
+        self.stdout.write(
+            f'{"route":<32}{"requests":>9}{"rps":>8}'
+            + ''.join(f'{f"p{p} ms":>9}' for p in PERCENTILES)
+            + f'{"max ms":>9}{"errors":>8}'
+        )
+        for route, route_samples in routes.items():
+            latencies = sorted(latency for latency, _ in route_samples)
+            errors = sum(not ok for _, ok in route_samples)
+            self.stdout.write(
+                f'{route:<32}{len(latencies):>9}'
+                f'{len(latencies) / duration:>8.1f}'
+                + ''.join(
+                    f'{get_percentile(latencies, p) * 1000:>9.1f}'
+                    for p in PERCENTILES
+                )
+                + f'{latencies[-1] * 1000:>9.1f}'
+                f'{errors / len(latencies):>8.1%}'
+            )
+
+    def write_cache_report(self, counts):
+        """Write hits, misses and hit rate of every server cache."""
+        totals = defaultdict(lambda: [0, 0])
+        for worker_counts in counts:
+            for name, (hits, misses) in worker_counts.items():
+                totals[name][0] += hits
+                totals[name][1] += misses
+        if not totals:
+            self.stdout.write(self.messages.get('no_cache_metrics'))
+            return
+        self.stdout.write(
+            f'{"cache":<32}{"hits":>9}{"misses":>9}{"hit rate":>10}'
+        )
+        for name, (hits, misses) in sorted(totals.items()):
+            self.stdout.write(
+                f'{name:<32}{hits:>9}{misses:>9}'
+                f'{hits / ((hits + misses) or 1):>10.1%}'
+            )
+
+
+def get_percentile(values, percentile):
+    """Return percentile of sorted values by the nearest rank method."""
+    rank = max(math.ceil(percentile / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+class HttpClient:
+    """HTTP client keeping one connection alive between requests."""
+
+    def __init__(self, host, port, secure=False):
+        connection_class = (http.client.HTTPSConnection if secure
+                            else http.client.HTTPConnection)
+        self.connection = connection_class(host, port, timeout=30)
+
+    def request(self, method, path, data=None, token=None):
+        """Make request and return response status, body and headers."""
+        headers = {'Accept': 'application/json'}
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        if token is not None:
+            headers['Authorization'] = f'Token {token}'
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read(), response.msg
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+
+
+class LoadWorker:
+    """
+    Worker replaying random scenarios until the deadline. Every request is
+     recorded as a sample (route, latency, ok), cache hits and misses from
+     the Server-Timing header are summed up by cache.
+    """
+
+    def __init__(self, url, context, options, number):
+        self.client = HttpClient(url.hostname, url.port,
+                                 url.scheme == 'https')
+        self.context = context
+        self.options = options
+        self.random = random.Random(f'{options["seed"]}-{number}')
+        self.samples = []
+        self.cache_counts = defaultdict(lambda: [0, 0])
+        self.names = list(SCENARIOS)
+        self.weights = list(SCENARIOS.values())
+
+    def run(self, deadline):
+        """
+        Run scenarios until deadline and return recorded samples and cache
+         counters.
+        """
+        while time.monotonic() < deadline:
+            scenario = self.random.choices(self.names, self.weights)[0]
+            getattr(self, scenario)()
+        return self.samples, dict(self.cache_counts)
+
+    def request(self, route, method, path, token=None, data=None,
+                expected=(200,)):
+        """
+        Make request, record its latency and success and return response
+         status and body.
+        """
+        start = time.perf_counter()
+        try:
+            status, body, headers = self.client.request(method, path, data,
+                                                        token)
+        except (OSError, http.client.HTTPException):
+            status, body, headers = None, b'', {}
+        self.samples.append(
+            (route, time.perf_counter() - start, status in expected)
+        )
+        self.count_caches(headers.get('Server-Timing', ''))
+        return status, body
+
+    def count_caches(self, server_timing):
+        """Add cache hits and misses from the Server-Timing header."""
+        for name, hits, misses in CACHE_METRIC_RE.findall(server_timing):
+            self.cache_counts[name][0] += int(hits)
+            self.cache_counts[name][1] += int(misses)
+
+    def get_token(self, anonymous_allowed=False):
+        """Return token of a random user or None for an anonymous user."""
+        if anonymous_allowed and (
+                self.random.random() < self.options['anonymous_share']):
+            return None
+        return self.random.choice(self.context['tokens'])
+
+    def get_recipe_id(self):
+        """Return id of a random recipe from the first pages."""
+        return self.random.choice(self.context['recipe_ids'])
+
+    def browse_recipes(self):
+        """Open first pages of recipes, sometimes filtered by tags."""
+        token = self.get_token(anonymous_allowed=True)
+        params = {'limit': PAGE_LIMIT}
+        if self.context['tags'] and self.random.random() < 0.5:
+            params['tags'] = self.random.sample(
+                self.context['tags'],
+                self.random.randint(1, min(2, len(self.context['tags']))),
+            )
+        pages = 1
+        for page in range(1, self.random.randint(1, 3) + 1):
+            if page > pages:
+                break
+            params['page'] = page
+            status, body = self.request(
+                'recipes-list', 'GET',
+                '/api/recipes/?' + urlencode(params, doseq=True), token,
+            )
+            if status != 200:
+                break
+            pages = math.ceil(json.loads(body)['count'] / PAGE_LIMIT)
+
+    def open_recipe(self):
+        self.request(
+            'recipes-detail', 'GET', f'/api/recipes/{self.get_recipe_id()}/',
+            self.get_token(anonymous_allowed=True),
+        )
+
+    def search_ingredients(self):
+        """Type an ingredient name letter by letter as autocomplete does."""
+        prefix = self.random.choice(self.context['prefixes'])
+        for length in range(1, len(prefix) + 1):
+            self.request(
+                'ingredients-search', 'GET',
+                '/api/ingredients/?' + urlencode({'name': prefix[:length]}),
+            )
+
+    def toggle_favorite(self):
+        self.toggle('favorite')
+
+    def toggle_shopping_cart(self):
+        self.toggle('shopping_cart')
+
+    def toggle(self, action):
+        """Add recipe to favorite or cart and then remove it."""
+        token = self.get_token()
+        path = f'/api/recipes/{self.get_recipe_id()}/{action}/'
+        route = f'recipes-{action.replace("_", "-")}'
+        self.request(route, 'POST', path, token, expected=(201, 400))
+        self.request(route, 'DELETE', path, token, expected=(204, 400))
+
+    def browse_subscriptions(self):
+        self.request(
+            'users-subscriptions', 'GET',
+            '/api/users/subscriptions/?' + urlencode(
+                {'limit': PAGE_LIMIT, 'recipes_limit': RECIPES_LIMIT}
+            ),
+            self.get_token(),
+        )
+
+    def download_shopping_list(self):
+        self.request(
+            'recipes-download-shopping-cart', 'GET',
+            '/api/recipes/download_shopping_cart/', self.get_token(),
+        )
@@ -0,0 +1,90 @@
+import logging
+import random
+
+from django.conf import settings
+from django.db import connection
+
+from .timing import RequestTimings, current_timings
+from recipes.caches import local_caches
+
+logger = logging.getLogger('api.timing')
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware measuring total time, number and time of database queries,
+     view, serializer and render time of sampled API requests.
+    Timings are returned in the Server-Timing header and written to the
+     api.timing log with the view name, e.g. RecipeViewSet.list. The log line
+     also has hit rates of in-process caches of the worker. The share of
+     measured requests is set by SERVER_TIMING_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        self.path_prefix = settings.SERVER_TIMING_PATH_PREFIX
+
+    def __call__(self, request):
+        if (not request.path.startswith(self.path_prefix)
+                or random.random() >= self.sample_rate):
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with connection.execute_wrapper(timings.queries):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        timings.finish()
+        response['Server-Timing'] = timings.as_header()
+        self.log(request, response, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current_timings.get()
+        if timings is not None:
+            timings.label = get_view_label(request, view_func)
+            timings.start('view')
+
+    def process_template_response(self, request, response):
+        timings = current_timings.get()
+        if timings is not None:
+            timings.stop('view')
+            timings.start('render')
+            response.add_post_render_callback(
+                lambda response: timings.stop('render')
+            )
+        return response
+
+    def log(self, request, response, timings):
+        fields = {
+            'view': timings.label,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **timings.as_log_fields(),
+        }
+        for cache in local_caches:
+            stats = cache.stats()
+            fields[f'{cache.name}_cache_hit_rate'] = round(stats['hit_rate'],
+                                                           3)
+        logger.info(
+            ' '.join(f'{name}={value}' for name, value in fields.items()),
+            extra={'timings': fields},
+        )
+
+
+def get_view_label(request, view_func):
+    """
+    Return name of the view class and the action of a viewset, e.g.
+     RecipeViewSet.list, or name of the view function.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', type(view_func).__name__)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action is None:
+        return view_class.__name__
+    return f'{view_class.__name__}.{action}'
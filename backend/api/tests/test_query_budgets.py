@@ -0,0 +1,164 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.urls import router
+from recipes.loaders import get_batches
+from recipes.models import (AmountIngredient, Ingredient, Recipe,
+                            ShoppingListItem, Tag, TagRecipe)
+from recipes.tests.utils import clear_caches, create_user, get_client
+
+# Maximum number of queries for a route: (anonymous, authenticated).
+QUERY_BUDGETS = {
+    'api-root': (0, 1),
+    'users-list': (2, 4),
+    'users-detail': (1, 3),
+    'users-me': (0, 1),
+    'users-subscriptions': (0, 5),
+    'tags-list': (1, 2),
+    'tags-detail': (1, 2),
+    'ingredients-list': (1, 2),
+    'ingredients-detail': (1, 2),
+    'recipes-list': (4, 8),
+    'recipes-detail': (3, 7),
+    'recipes-download-shopping-cart': (0, 2),
+}
+DATA_SIZES = (10, 100, 1000)
+PAGE_SIZES = (5, 50)
+LIST_ROUTES = ('users-list', 'users-subscriptions', 'recipes-list')
+AUTHOR_PER_RECIPES = 5
+INGREDIENTS_PER_RECIPE = 5
+TAGS_PER_RECIPE = 2
+BULK_SIZE = 100
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class QueryBudgetTests(TestCase):
+    """
+    Tests of the number of SQL queries of every GET route of the API router
+     on behalf of an anonymous and an authenticated user. The number must be
+     within the budget of the route and must not grow with the amount of
+     data or the page size, which is a sign of an N+1 problem.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = create_user('viewer')
+        cls.tags = [
+            Tag.objects.create(name=f'tag {i}', color=f'#{i:06x}',
+                               slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient {i}',
+                                      measurement_unit='g')
+            for i in range(50)
+        ]
+
+    def setUp(self):
+        clear_caches()
+        self.authors = []
+        self.recipes = []
+        self.clients = {'anon': APIClient(), 'auth': get_client(self.viewer)}
+
+    def seed(self, size):
+        """
+        Add recipes until there are size of them. The viewer follows every
+         author and adds part of recipes to favorites and the shopping cart
+         through the API, so the shopping list is aggregated as in use.
+        """
+        client = self.clients['auth']
+        for i in range(len(self.authors),
+                       max(size // AUTHOR_PER_RECIPES, 1)):
+            author = create_user(f'author{i}')
+            self.authors.append(author)
+            client.post(f'/api/users/{author.pk}/subscribe/')
+
+        new_recipes = []
+        for i in range(len(self.recipes), size):
+            recipe = Recipe.objects.create(
+                author=self.authors[i % len(self.authors)],
+                name=f'recipe {i}', text='text', cooking_time=10,
+                image='recipes/images/seed.jpg',
+            )
+            new_recipes.append(recipe)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe,
+                      tag=self.tags[(recipe.pk + i) % len(self.tags)])
+            for recipe in new_recipes for i in range(TAGS_PER_RECIPE)
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                recipe=recipe,
+                ingredient=self.ingredients[
+                    (recipe.pk + i) % len(self.ingredients)
+                ],
+                amount=i + 1,
+            )
+            for recipe in new_recipes for i in range(INGREDIENTS_PER_RECIPE)
+        )
+        for url, recipes in (('/api/recipes/favorite/', new_recipes[::2]),
+                             ('/api/recipes/shopping_cart/',
+                              new_recipes[::3])):
+            for batch in get_batches(recipes, BULK_SIZE):
+                client.post(url, {'recipes': [recipe.pk for recipe in batch]},
+                            format='json')
+        self.recipes.extend(new_recipes)
+
+    def get_urls(self):
+        """Yield route name and url of every measured request."""
+        kwargs = {
+            'users-detail': {'id': self.authors[0].pk},
+            'tags-detail': {'pk': self.tags[0].pk},
+            'ingredients-detail': {'pk': self.ingredients[0].pk},
+            'recipes-detail': {'pk': self.recipes[0].pk},
+        }
+        for name in QUERY_BUDGETS:
+            url = reverse(f'api:{name}', kwargs=kwargs.get(name))
+            if name in LIST_ROUTES:
+                for limit in PAGE_SIZES:
+                    yield name, f'{url}?limit={limit}&recipes_limit=3'
+            else:
+                yield name, url
+
+    def request(self, client, url):
+        """Request url with empty caches and read the whole response."""
+        clear_caches()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def test_every_get_route_has_budget(self):
+        routes = {
+            pattern.name for pattern in router.urls
+            if 'get' in (getattr(pattern.callback, 'actions', None)
+                         or {'get': None})
+        }
+        self.assertEqual(routes - set(QUERY_BUDGETS), set())
+
+    def test_seeded_shopping_list_is_not_empty(self):
+        self.seed(DATA_SIZES[0])
+        self.assertTrue(
+            ShoppingListItem.objects.filter(user=self.viewer).exists()
+        )
+
+    def test_queries_are_within_budgets_and_do_not_grow(self):
+        counts = {}
+        for size in DATA_SIZES:
+            self.seed(size)
+            for name, url in self.get_urls():
+                for caller, client in self.clients.items():
+                    with self.subTest(url=url, caller=caller, size=size):
+                        if (name, caller) in counts:
+                            with self.assertNumQueries(counts[name, caller]):
+                                self.request(client, url)
+                            continue
+                        with CaptureQueriesContext(connection) as queries:
+                            self.request(client, url)
+                        counts[name, caller] = len(queries)
+                        self.assertLessEqual(
+                            len(queries),
+                            QUERY_BUDGETS[name][caller == 'auth'],
+                        )
@@ -0,0 +1,144 @@
+"""
+Module for measuring where the time of an API request goes.
+
+Timings of the current request are kept in a context variable, so code deep
+in serializers can add to them without passing the request around. When no
+request is measured, the measurement helpers do nothing.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their total duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTimings:
+    """
+    Durations of the parts of one request in seconds, the number of
+     database queries and hits and misses of caches. Nested measurements of
+     the same part are counted once.
+    """
+    metrics = ('total', 'db', 'view', 'serialize', 'render')
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.queries = QueryTimer()
+        self.durations = dict.fromkeys(self.metrics, 0.0)
+        self.label = None
+        self.cache_counts = {}
+        self._started = {}
+
+    def start(self, name):
+        """
+        Start measuring the metric name and return True, return False if
+         it is already measured.
+        """
+        if name in self._started:
+            return False
+        self._started[name] = time.perf_counter()
+        return True
+
+    def stop(self, name):
+        """Add the duration since start of the metric name to it."""
+        start = self._started.pop(name, None)
+        if start is not None:
+            self.durations[name] += time.perf_counter() - start
+
+    @contextmanager
+    def measure(self, name):
+        """Add the duration of the block to the metric name."""
+        if not self.start(name):
+            yield
+            return
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def count_cache(self, name, hits=0, misses=0):
+        """Add hits and misses to the counters of the named cache."""
+        counts = self.cache_counts.setdefault(name, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+    def finish(self):
+        """
+        Stop metrics which are still measured and set total duration and
+         duration of database queries.
+        """
+        for name in list(self._started):
+            self.stop(name)
+        self.durations['total'] = time.perf_counter() - self.start_time
+        self.durations['db'] = self.queries.duration
+
+    def as_header(self):
+        """
+        Return value of the Server-Timing header with durations in ms and
+         cache counters, e.g. cache-token;desc="hits=1 misses=0".
+        """
+        metrics = [
+            f'{name};dur={duration * 1000:.1f}'
+            + (f';desc="{self.queries.count} queries"' if name == 'db' else '')
+            for name, duration in self.durations.items()
+        ]
+        metrics.extend(
+            f'cache-{name};desc="hits={hits} misses={misses}"'
+            for name, (hits, misses) in self.cache_counts.items()
+        )
+        return ', '.join(metrics)
+
+    def as_log_fields(self):
+        """Return fields of the log line with durations in ms."""
+        fields = {'queries': self.queries.count}
+        for name, duration in self.durations.items():
+            fields[f'{name}_ms'] = round(duration * 1000, 1)
+        for name, (hits, misses) in self.cache_counts.items():
+            fields[f'{name}_cache_hits'] = hits
+            fields[f'{name}_cache_misses'] = misses
+        return fields
+
+
+@contextmanager
+def measure(name):
+    """Add the duration of the block to the metric of the current request."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.measure(name):
+        yield
+
+
+def count_cache(name, hits=0, misses=0):
+    """Add hits and misses of the named cache to the current request."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.count_cache(name, hits, misses)
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding the time of to_representation to the serialize
+     metric of the current request. Nested serializers are counted once.
+    """
+
+    def to_representation(self, instance):
+        with measure('serialize'):
+            return super().to_representation(instance)
@@ -0,0 +1,138 @@
+"""
+Module for relations of the current user to serialized objects.
+
+Ids of recipes in favorites and in the shopping cart of a user and ids of
+authors they are subscribed to are kept in the objects cache as sorted
+integer arrays. An array is built with one query on the first use and is
+built again after the user adds or removes something, so checking a
+relation does not query the database.
+"""
+
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .timing import count_cache
+from recipes.caches import OBJECT_CACHE_ALIAS, bump_version, get_version
+from recipes.models import Cart, Favorite
+from users.models import Subscription
+
+CONTEXT_KEY = 'viewer_state'
+ARRAY_TYPE = 'q'
+
+# Linked model: (field of the user, field of the object).
+LINKED_MODELS = {
+    Subscription: ('user_from', 'user_to'),
+    Favorite: ('user', 'recipe'),
+    Cart: ('user', 'recipe'),
+}
+
+
+class ViewerStateCache:
+    """
+    Cache of sorted arrays of ids of objects linked to a user by the model.
+    An array is keyed by the version of relations of the user, which is
+     changed after a change is committed. The version is read before the
+     array is built, so an array built from data older than the change is
+     never used after it.
+    """
+    key_template = 'viewer_state:{}:{}:{}'
+    version_template = 'viewer_state:{}:{}'
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get_ids(self, model, user_id):
+        """Return sorted array of ids of objects linked to the user."""
+        cache = caches[OBJECT_CACHE_ALIAS]
+        key = self.get_key(model, user_id)
+        ids = cache.get(key)
+        count_cache('viewer_state', hits=int(ids is not None),
+                    misses=int(ids is None))
+        if ids is None:
+            user_field, object_field = LINKED_MODELS[model]
+            object_id = f'{object_field}_id'
+            ids = array(ARRAY_TYPE, model.objects.filter(
+                **{user_field: user_id}
+            ).order_by(object_id).values_list(object_id, flat=True))
+            cache.set(key, ids, self.timeout)
+        return ids
+
+    def invalidate(self, model, user_ids):
+        """
+        Change versions of relations of the users after commit, so their
+         arrays are built again.
+        """
+        names = [self.version_template.format(model._meta.model_name, user_id)
+                 for user_id in set(user_ids) if user_id is not None]
+        transaction.on_commit(lambda: self._bump_versions(names))
+
+    def get_key(self, model, user_id):
+        model_name = model._meta.model_name
+        version = get_version(
+            self.version_template.format(model_name, user_id),
+            OBJECT_CACHE_ALIAS,
+        )
+        return self.key_template.format(model_name, user_id, version)
+
+    def _bump_versions(self, names):
+        for name in names:
+            bump_version(name, OBJECT_CACHE_ALIAS)
+
+
+viewer_state_cache = ViewerStateCache(timeout=settings.VIEWER_STATE_CACHE_TTL)
+
+
+def contains(ids, pk):
+    """Return True if sorted array of ids contains pk."""
+    index = bisect_left(ids, pk)
+    return index < len(ids) and ids[index] == pk
+
+
+class ViewerStateLoader:
+    """
+    Request-scoped loader of relations of the viewer to objects by their ids.
+    Every array is taken from the cache once per request. An anonymous
+     viewer has no relations.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self._ids = {}
+
+    def get_ids(self, model):
+        """Return sorted array of ids of objects linked to the viewer."""
+        if not self.is_authenticated:
+            return array(ARRAY_TYPE)
+        if model not in self._ids:
+            self._ids[model] = viewer_state_cache.get_ids(model, self.user.pk)
+        return self._ids[model]
+
+    def is_subscribed(self, user_pk):
+        if self.is_authenticated and user_pk == self.user.pk:
+            return False
+        return contains(self.get_ids(Subscription), user_pk)
+
+    def is_favorited(self, recipe_pk):
+        return contains(self.get_ids(Favorite), recipe_pk)
+
+    def is_in_shopping_cart(self, recipe_pk):
+        return contains(self.get_ids(Cart), recipe_pk)
+
+
+def get_viewer_state(context):
+    """
+    Return the loader of the serializer context, it is created on the first
+     use for the user of the request.
+    """
+    loader = context.get(CONTEXT_KEY)
+    if loader is None:
+        request = context.get('request')
+        loader = context[CONTEXT_KEY] = ViewerStateLoader(
+            getattr(request, 'user', None)
+        )
+    return loader
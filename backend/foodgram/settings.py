@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -20,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -30,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +74,38 @@ DATABASES = {
     }
 }
 
+# Versions of cached data are kept in the default cache, so it is shared by
+# workers and management commands: the file cache is shared by processes of
+# one container, memcached by several containers.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+# Serialized recipes, their versions and relations of users take an entry per
+# object, so they are kept apart from the default cache in a larger one. It is
+# in memory of the process unless a cache backend is set.
+OBJECT_CACHE_BACKEND = os.getenv(
+    'OBJECT_CACHE_BACKEND',
+    os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+)
+# Memcached has its own memory limit and does not accept MAX_ENTRIES.
+OBJECT_CACHE_OPTIONS = {} if 'memcached' in OBJECT_CACHE_BACKEND.lower() else {
+    'MAX_ENTRIES': int(os.getenv('OBJECT_CACHE_MAX_ENTRIES', 100000)),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache'),
+        ),
+    },
+    'objects': {
+        'BACKEND': OBJECT_CACHE_BACKEND,
+        'LOCATION': os.getenv('OBJECT_CACHE_LOCATION', 'objects'),
+        'OPTIONS': OBJECT_CACHE_OPTIONS,
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,6 +142,11 @@ STATIC_ROOT = BASE_DIR / STATIC_URL
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / MEDIA_URL
 
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -117,10 +157,40 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ),
 }
 
+TOKEN_CACHE_MAX_SIZE = int(os.getenv('TOKEN_CACHE_MAX_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+VIEWER_STATE_CACHE_TTL = int(os.getenv('VIEWER_STATE_CACHE_TTL', 3600))
+RECIPE_RESPONSE_CACHE_MAX_SIZE = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_MAX_SIZE', 1000)
+)
+# Counters of favorites used by ordering=popular do not drop the cache.
+RECIPE_RESPONSE_CACHE_TTL = int(os.getenv('RECIPE_RESPONSE_CACHE_TTL', 60))
+RECIPE_FRAGMENT_CACHE_TTL = int(os.getenv('RECIPE_FRAGMENT_CACHE_TTL', 600))
+
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', 1))
+SERVER_TIMING_PATH_PREFIX = '/api/'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('SERVER_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGOUT_ON_PASSWORD_CHANGE': True,
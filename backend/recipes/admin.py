@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import AmountIngredient, Ingredient, Recipe, Tag, TagRecipe
+from .models import (AmountIngredient, Ingredient, Recipe, ShoppingListItem,
+                     Tag, TagRecipe)
+from .shopping_list import track_recipe_ingredients
 
 
 class AmountIngredientsInLine(admin.TabularInline):
@@ -31,14 +33,39 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'author', 'name',
-                    'cooking_time', 'favorites_counter')
+                    'cooking_time', 'favorites_count', 'cart_count')
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
     inlines = (AmountIngredientsInLine, TagRecipeInline)
 
+    def save_related(self, request, form, formsets, change):
+        with track_recipe_ingredients((form.instance.pk,)):
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(AmountIngredient)
 class AmountIngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
     search_fields = ('recipe__name', 'ingredient__name')
     list_filter = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        with track_recipe_ingredients((obj.recipe_id,
+                                       form.initial.get('recipe'))):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with track_recipe_ingredients((obj.recipe_id,)):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe', flat=True))
+        with track_recipe_ingredients(recipe_ids):
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
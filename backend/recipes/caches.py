@@ -0,0 +1,156 @@
+"""
+Module for versions of cached data and in-process caches.
+
+Versions are kept in the default cache, so with a cache shared between
+workers (e.g. memcached) every worker notices that data has changed and
+drops its own copy. Versions of single objects are kept in the objects cache
+next to the cached objects.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from api.timing import count_cache
+
+OBJECT_CACHE_ALIAS = 'objects'
+VERSION_KEY = 'version:{}'
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+RECIPES_VERSION = 'recipes'
+RECIPE_FRAGMENTS_VERSION = 'recipe_fragments'
+
+# In-process caches of the worker, their hit rates are logged with requests.
+local_caches = []
+
+
+def get_version(name, alias=DEFAULT_CACHE_ALIAS):
+    """Return current version of the named data, creating it if necessary."""
+    cache = caches[alias]
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        # A time-based initial value differs from versions that were in the
+        # cache before it was cleared or restarted.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names, alias=DEFAULT_CACHE_ALIAS):
+    """
+    Return dict of current versions of the named data taken from the cache
+     at once, missing versions are created.
+    """
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = caches[alias].get_many(keys)
+    for key in keys.keys() - versions.keys():
+        versions[key] = get_version(keys[key], alias)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(name, alias=DEFAULT_CACHE_ALIAS):
+    """Change version of the named data and return the new one."""
+    try:
+        return caches[alias].incr(VERSION_KEY.format(name))
+    except ValueError:
+        return get_version(name, alias)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """Check that the cache is shared between processes."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+class LocalCache:
+    """
+    Bounded in-process cache with time to live.
+    The least recently used entries are dropped when the cache is full.
+     Every entry keeps the version of the data it was made for and is used
+     only while the version is the same, so a change made in one worker drops
+     the entries in all of them.
+    Hits and misses are counted for the worker and, if the cache has a name,
+     reported for the current request and logged with it.
+    """
+    name = None
+    version_name = None
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.name is not None:
+            local_caches.append(self)
+
+    def get(self, key):
+        """Return cached value or None."""
+        version = self.get_version(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = (entry is not None and entry[0] >= time.monotonic()
+                   and entry[1] == version)
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self._entries.pop(key, None)
+                self.misses += 1
+        if self.name is not None:
+            count_cache(self.name, hits=int(hit), misses=int(not hit))
+        return entry[2] if hit else None
+
+    def set(self, key, value, version=None):
+        """
+        Cache value for the key. The version, which the value was made for,
+         should be taken before the value is made, by default it is the
+         current one.
+        """
+        if version is None:
+            version = self.get_version(key)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_version(self, key=None):
+        """Return current version of the cached data."""
+        return get_version(self.version_name)
+
+    def invalidate(self):
+        """Drop cached entries in all workers."""
+        bump_version(self.version_name)
+
+    def stats(self):
+        """Return hit/miss counters, hit rate and the current size."""
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'size': len(self._entries),
+        }
+
+
+class ResponseCache(LocalCache):
+    """
+    Cache of rendered responses of recipes for anonymous users.
+    All entries are dropped when recipes, their ingredients, tags or authors
+     change. Hits and misses are reported as the response cache.
+    """
+    name = 'response'
+    version_name = RECIPES_VERSION
+
+
+recipe_response_cache = ResponseCache(
+    max_size=settings.RECIPE_RESPONSE_CACHE_MAX_SIZE,
+    ttl=settings.RECIPE_RESPONSE_CACHE_TTL,
+)
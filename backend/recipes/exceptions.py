@@ -0,0 +1,10 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class RequestEntityTooLarge(APIException):
+    """Exception for a request body exceeding the allowed size."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('Request entity is too large.')
+    default_code = 'request_entity_too_large'
@@ -1,6 +1,14 @@
+from django.db.models import Exists, OuterRef
+from django.utils.translation import gettext_lazy as _
 from django_filters import rest_framework as filter
 
-from .models import Ingredient, Recipe, Tag
+from .models import Cart, Favorite, Ingredient, Recipe, Tag
+from .search import search_recipes
+from api.viewer_state import viewer_state_cache
+
+# Largest number of cached ids of linked recipes passed to the query as a
+# list, larger sets are filtered by a subquery of the linked model.
+LINKED_IDS_LIMIT = 100
 
 
 class IngredientFilter(filter.FilterSet):
@@ -15,7 +23,9 @@ class IngredientFilter(filter.FilterSet):
 class RecipeFilter(filter.FilterSet):
     """
     Filter for recipes. Allow filters by tags, is_favorited and
-     is_in_shopping_cart fields.
+     is_in_shopping_cart fields. ordering=popular sorts recipes by the number
+     of times they have been added to favorites. search finds recipes by
+     name and text and sorts them by rank, unless another ordering is set.
     """
     tags = filter.ModelMultipleChoiceFilter(
         field_name='tags__slug',
@@ -27,19 +37,44 @@ class RecipeFilter(filter.FilterSet):
     is_in_shopping_cart = filter.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filter.CharFilter(method='filter_search')
+    ordering = filter.ChoiceFilter(
+        choices=(('popular', _('popular')),),
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
 
     def filter_is_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return queryset.filter(favorites__user=user)
-        return queryset
+        return self.filter_linked(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_linked(queryset, Cart, value)
+
+    def filter_linked(self, queryset, linked_model, value):
+        """
+        Filter recipes linked to the current user by ids from the viewer
+         state cache, or by a subquery of the linked model if there are too
+         many ids to pass them as query parameters.
+        """
         user = self.request.user
-        if value and user.is_authenticated:
-            return queryset.filter(cart__user=self.request.user)
+        if not value or not user.is_authenticated:
+            return queryset
+        ids = viewer_state_cache.get_ids(linked_model, user.pk)
+        if len(ids) <= LINKED_IDS_LIMIT:
+            return queryset.filter(pk__in=list(ids))
+        return queryset.filter(Exists(linked_model.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by('-favorites_count',
+                                     *Recipe._meta.ordering)
         return queryset
@@ -0,0 +1,88 @@
+"""
+Module for the cache of serialized recipes.
+
+The part of a recipe representation, which is the same for every viewer, is
+kept in the objects cache. It is keyed by the version of the recipe, which
+is changed after the recipe, its tags or ingredients are changed, so a
+changed recipe is serialized again while others are taken from the cache.
+Relations of the viewer to the recipe are added for every request.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+
+from .caches import (OBJECT_CACHE_ALIAS, RECIPE_FRAGMENTS_VERSION,
+                     bump_version, get_versions)
+from .models import Recipe, get_recipe_related_lookups
+from api.timing import count_cache
+
+
+def get_recipe_version_name(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+class RecipeFragmentCache:
+    """
+    Cache of representations of recipes independent of the viewer.
+    A key consists of the version of all recipes, which is changed after tags,
+     ingredients or authors are changed, the version of the recipe and the
+     base url of image links. A change committed while the recipe is being
+     serialized lives no longer than the timeout of the cache entry.
+    """
+    key_template = 'recipe_fragment:{}:{}:{}:{}'
+    version_name = RECIPE_FRAGMENTS_VERSION
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get_many(self, recipes, serialize, base_url=''):
+        """
+        Return representations of recipes in the same order. Tags and
+         ingredients are loaded only for recipes missing in the cache, then
+         they are serialized by serialize function and cached.
+        """
+        cache = caches[OBJECT_CACHE_ALIAS]
+        keys = self.get_keys(recipes, base_url)
+        fragments = cache.get_many(keys)
+        missed = [(key, recipe) for key, recipe in zip(keys, recipes)
+                  if key not in fragments]
+        count_cache('fragment', hits=len(fragments), misses=len(missed))
+        if missed:
+            prefetch_related_objects([recipe for _, recipe in missed],
+                                     *get_recipe_related_lookups())
+            new_fragments = {key: serialize(recipe) for key, recipe in missed}
+            cache.set_many(new_fragments, self.timeout)
+            fragments.update(new_fragments)
+        return [fragments[key] for key in keys]
+
+    def get_keys(self, recipes, base_url):
+        names = [get_recipe_version_name(recipe.pk) for recipe in recipes]
+        versions = get_versions([self.version_name, *names],
+                                OBJECT_CACHE_ALIAS)
+        return [
+            self.key_template.format(versions[self.version_name], recipe.pk,
+                                     versions[name], base_url)
+            for recipe, name in zip(recipes, names)
+        ]
+
+    def invalidate(self, recipe_ids):
+        """Drop cached representations of the recipes."""
+        for recipe_id in set(recipe_ids):
+            bump_version(get_recipe_version_name(recipe_id),
+                         OBJECT_CACHE_ALIAS)
+
+    def invalidate_author(self, author_id):
+        """Drop cached representations of recipes of the author."""
+        self.invalidate(Recipe.objects.filter(
+            author_id=author_id
+        ).values_list('pk', flat=True))
+
+    def invalidate_all(self):
+        """Drop cached representations of all recipes."""
+        bump_version(self.version_name, OBJECT_CACHE_ALIAS)
+
+
+recipe_fragment_cache = RecipeFragmentCache(
+    timeout=settings.RECIPE_FRAGMENT_CACHE_TTL
+)
@@ -0,0 +1,136 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from .caches import recipe_response_cache
+from .fragments import recipe_fragment_cache
+
+logger = logging.getLogger(__name__)
+
+# Maximum width and height of every variant, the aspect ratio is kept.
+IMAGE_VARIANT_SIZES = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1600, 1600),
+}
+# Format name and save options of Pillow for every file format.
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    """Return the worker pool for building image variants."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def convert_for_format(image, pillow_format):
+    """Convert the image to a mode which can be saved in the format."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    if pillow_format == 'WEBP' and image.mode == 'RGBA':
+        return image
+    return image.convert('RGB')
+
+
+def has_actual_variants(recipe):
+    """Check that variants of the recipe are built for its current image."""
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') == recipe.image.name
+    )
+
+
+def make_image_variants(field_file):
+    """
+    Resize the image to every variant size and save it in every format.
+    Return dict with the source image name and names of variant files.
+    """
+    storage = field_file.storage
+    directory = os.path.join(field_file.field.upload_to, 'variants')
+    variants = {'source': field_file.name}
+    with field_file.open('rb') as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+        for variant, size in IMAGE_VARIANT_SIZES.items():
+            image = source.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            variants[variant] = {}
+            for file_format, (pillow_format, options) in (
+                    IMAGE_VARIANT_FORMATS.items()):
+                buffer = BytesIO()
+                convert_for_format(image, pillow_format).save(
+                    buffer, pillow_format, **options
+                )
+                variants[variant][file_format] = storage.save(
+                    os.path.join(directory, f'{variant}.{file_format}'),
+                    ContentFile(buffer.getvalue()),
+                )
+    return variants
+
+
+def build_image_variants(recipe_id):
+    """
+    Build variants of the recipe image and save their names to the recipe.
+    The names are not saved if the image has been changed in the meantime.
+     Return True if the variants have been built.
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants'
+    ).first()
+    if recipe is None or not recipe.image or has_actual_variants(recipe):
+        return False
+    try:
+        variants = make_image_variants(recipe.image)
+    except (OSError, ValueError) as error:
+        logger.warning('Failed to build variants of recipe %s image: %s',
+                       recipe_id, error)
+        return False
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_variants=variants)
+    if updated:
+        recipe_fragment_cache.invalidate([recipe_id])
+        recipe_response_cache.invalidate()
+    return True
+
+
+def build_image_variants_in_worker(recipe_id):
+    """Build variants of the recipe image in a thread of the worker pool."""
+    try:
+        build_image_variants(recipe_id)
+    except Exception:
+        logger.exception('Failed to build variants of recipe %s image',
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_variants(recipe):
+    """
+    Build variants of the recipe image in the worker pool after the current
+     transaction is committed.
+    """
+    if not recipe.image or has_actual_variants(recipe):
+        return
+    recipe_id = recipe.pk
+    transaction.on_commit(
+        lambda: get_executor().submit(build_image_variants_in_worker,
+                                      recipe_id)
+    )
@@ -0,0 +1,132 @@
+"""Module for in-memory index of ingredients used for autocomplete."""
+
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db import connection
+
+from .caches import INGREDIENTS_VERSION, bump_version, get_version
+from .models import Ingredient
+from .search import search_ingredients_trigram
+from .serializers import IngredientSerializer
+
+# The same defaults as pg_trgm has, so both backends find the same names.
+TRIGRAM_THRESHOLD = 0.3
+FUZZY_MIN_LENGTH = 3
+FUZZY_LIMIT = 20
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def get_trigrams(text):
+    """
+    Return set of trigrams of text like pg_trgm does: every word is
+     case-folded and padded with two spaces before and one space after.
+    """
+    trigrams = set()
+    for word in WORD_RE.findall(text.casefold()):
+        word = f'  {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+class IngredientIndex:
+    """
+    In-memory index of ingredients for autocomplete by the name prefix.
+    Names are case-folded and sorted, so a lookup is a binary search that
+     returns already serialized rows. The index is rebuilt when the version of
+     ingredients changes, so the database is queried only after changes.
+    Fuzzy search by similar names uses the trigram index of the database on
+     PostgreSQL and the in-memory trigram index otherwise.
+    """
+    version_name = INGREDIENTS_VERSION
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = ([], [], {}, [])
+
+    def search(self, prefix):
+        """Return serialized ingredients whose name starts with prefix."""
+        keys, rows, _, _ = self._get_data()
+        return rows[slice(*self._find_prefix(keys, prefix))]
+
+    def search_fuzzy(self, query):
+        """
+        Return serialized ingredients whose name starts with query, followed
+         by no more than FUZZY_LIMIT ingredients with similar names, the most
+         similar go first. So typos in the query are tolerated.
+        """
+        keys, rows, postings, sizes = self._get_data()
+        start, end = self._find_prefix(keys, query)
+        found = rows[start:end]
+        if len(query.strip()) < FUZZY_MIN_LENGTH:
+            return found
+        limit = FUZZY_LIMIT + end - start
+        if connection.vendor == 'postgresql':
+            similar = search_ingredients_trigram(
+                Ingredient.objects.values(*IngredientSerializer.Meta.fields),
+                query, limit,
+            )
+        else:
+            similar = self._search_similar(query, limit, rows, postings,
+                                           sizes)
+        found_ids = {row['id'] for row in found}
+        return found + [
+            row for row in similar if row['id'] not in found_ids
+        ][:FUZZY_LIMIT]
+
+    def invalidate(self):
+        """Mark the index as outdated in all workers."""
+        bump_version(self.version_name)
+
+    def _find_prefix(self, keys, prefix):
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        return start, bisect_left(keys, prefix + chr(0x10ffff), lo=start)
+
+    def _search_similar(self, query, limit, rows, postings, sizes):
+        """
+        Return no more than limit rows with trigram similarity to query not
+         less than TRIGRAM_THRESHOLD. Only names sharing a trigram with the
+         query are counted, so the search does not scan the whole index.
+        """
+        trigrams = get_trigrams(query)
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(postings.get(trigram, ()))
+        similar = []
+        for index, count in shared.items():
+            similarity = count / (len(trigrams) + sizes[index] - count)
+            if similarity >= TRIGRAM_THRESHOLD:
+                similar.append((-similarity, index))
+        similar.sort()
+        return [rows[index] for _, index in similar[:limit]]
+
+    def _get_data(self):
+        version = get_version(self.version_name)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+        return self._data
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values(*IngredientSerializer.Meta.fields),
+            key=lambda row: (row['name'].casefold(), row['name'], row['id'])
+        )
+        keys = [row['name'].casefold() for row in rows]
+        postings = defaultdict(list)
+        sizes = []
+        for index, key in enumerate(keys):
+            trigrams = get_trigrams(key)
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(index)
+        self._data = (keys, rows, dict(postings), sizes)
+        self._version = version
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .models import Ingredient
+
+JSON_READ_SIZE = 64 * 1024
+JSON_SKIP_CHARS = ' \t\r\n,'
+COPY_TABLE = 'ingredient_load'
+
+
+def read_csv(file):
+    """Yield rows of csv file one by one."""
+    yield from csv.reader(file, delimiter=',')
+
+
+def read_json_start(file, read_size):
+    """Read the first chunk of JSON file, which starts with an array."""
+    buffer = ''
+    chunk = None
+    while not buffer and chunk != '':
+        chunk = file.read(read_size)
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('JSON file should contain an array.')
+    return buffer
+
+
+def read_json(file, read_size=JSON_READ_SIZE):
+    """
+    Yield items of JSON array from file one by one. The file is read by
+     chunks, so the whole file is not loaded in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = read_json_start(file, read_size)
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SKIP_CHARS:
+            position += 1
+        if position == len(buffer):
+            buffer = file.read(read_size)
+            position = 0
+            if not buffer:
+                raise ValueError('Unexpected end of JSON file.')
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(read_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def get_batches(iterable, batch_size):
+    """Yield lists of no more than batch_size items of iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_ingredients(rows, batch_size):
+    """
+    Insert ingredients from (name, measurement_unit) rows by batches in one
+     transaction. Rows, which are already in the table, are skipped. Return
+     number of created ingredients.
+    """
+    if connection.vendor == 'postgresql':
+        return copy_ingredients(rows, batch_size)
+    return insert_ingredients(rows, batch_size)
+
+
+def insert_ingredients(rows, batch_size):
+    """Load ingredients with batched inserts ignoring conflicts."""
+    with transaction.atomic():
+        count_before = Ingredient.objects.count()
+        for batch in get_batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch),
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - count_before
+
+
+def copy_ingredients(rows, batch_size):
+    """
+    Load ingredients with COPY to a temporary table by batches and then
+     insert them to the table of ingredients with one query.
+    """
+    table = Ingredient._meta.db_table
+    name_length = Ingredient._meta.get_field('name').max_length
+    unit_length = Ingredient._meta.get_field('measurement_unit').max_length
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {COPY_TABLE} '
+            f'(name varchar({name_length}), '
+            f'measurement_unit varchar({unit_length})) ON COMMIT DROP'
+        )
+        for batch in get_batches(rows, batch_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {COPY_TABLE} (name, measurement_unit) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM {COPY_TABLE} '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        return cursor.rowcount
@@ -0,0 +1,27 @@
+"""Management command for building variants of recipe images."""
+
+from django.core.management import BaseCommand
+from django.utils.translation import gettext_lazy as _
+
+from recipes.images import build_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = _('Builds resized variants of recipe images that are missing them')
+    messages = {
+        'building': _('Building variants of recipe images...'),
+        'count_built': _('Recipe images with built variants - '),
+    }
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.messages.get('building'))
+        recipe_ids = Recipe.objects.exclude(image='').values_list(
+            'id', flat=True
+        )
+        built = sum(
+            build_image_variants(recipe_id) for recipe_id in recipe_ids
+        )
+        self.stdout.write(self.style.SUCCESS(
+            self.messages.get('count_built') + str(built))
+        )
@@ -0,0 +1,270 @@
+"""
+Management command for generating a large synthetic data set.
+
+Users, recipes, tags of recipes, amounts of ingredients, favorites, shopping
+carts and subscriptions are generated with a seeded random generator, so the
+same options always give the same data. Popularity of recipes and authors
+follows a power law: a few recipes are in favorites of many users and a few
+authors have many followers and recipes.
+"""
+
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from recipes.caches import TAGS_VERSION, bump_version, recipe_response_cache
+from recipes.loaders import get_batches
+from recipes.models import (AmountIngredient, Cart, Favorite, Ingredient,
+                            Recipe, Tag, TagRecipe)
+from recipes.shopping_list import rebuild_shopping_lists
+from recipes.utils import recount_recipe_counters
+from users.models import Subscription
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'generated'
+DEFAULT_PASSWORD = 'generated-password'
+GENERATED_IMAGE = 'recipes/images/generated.jpg'
+
+
+class Command(BaseCommand):
+    help = _('Generates users, recipes, favorites, shopping carts and '
+             'subscriptions for load testing')
+    messages = {
+        'no_ingredients': _('There are no ingredients, run populate_db '
+                            'command first'),
+        'count_rows': _('{} - {} rows, {:.0f} rows/sec'),
+        'recounting': _('Recounting counters and shopping lists...'),
+        'success': _('Data is generated in {:.1f} sec, password of users '
+                     'is "{}"'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help=_('Number of users.'))
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help=_('Number of recipes.'))
+        parser.add_argument('--tags', type=int, default=10,
+                            help=_('Minimal number of tags.'))
+        parser.add_argument('--tags-per-recipe', type=int, default=3,
+                            help=_('Maximal number of tags of a recipe.'))
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10,
+                            help=_('Maximal number of ingredients of a '
+                                   'recipe.'))
+        parser.add_argument('--favorites-per-user', type=float, default=20,
+                            help=_('Mean number of favorites of a user.'))
+        parser.add_argument('--carts-per-user', type=float, default=5,
+                            help=_('Mean number of recipes in a shopping '
+                                   'cart of a user.'))
+        parser.add_argument('--subscriptions-per-user', type=float,
+                            default=10,
+                            help=_('Mean number of subscriptions of a user.'))
+        parser.add_argument('--popularity-exponent', type=float, default=1.1,
+                            help=_('Exponent of power law of popularity of '
+                                   'recipes and authors, 0 for uniform.'))
+        parser.add_argument('--seed', type=int, default=0,
+                            help=_('Seed of the random generator.'))
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help=_('Number of rows inserted at once.'))
+        parser.add_argument('--password', default=DEFAULT_PASSWORD,
+                            help=_('Password of generated users.'))
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(self.messages.get('no_ingredients'))
+
+        start = time.perf_counter()
+        generator = DataGenerator(options, ingredient_ids, self.report)
+        with transaction.atomic():
+            generator.generate()
+        self.stdout.write(self.messages.get('recounting'))
+        recount_recipe_counters()
+        rebuild_shopping_lists()
+        # Rows are created in bulk without signals, so caches are dropped here.
+        bump_version(TAGS_VERSION)
+        recipe_response_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            self.messages.get('success').format(
+                time.perf_counter() - start, options['password']
+            )
+        ))
+
+    def report(self, model, count, duration):
+        """Write the number of generated rows of the model and the speed."""
+        self.stdout.write(self.messages.get('count_rows').format(
+            model._meta.verbose_name_plural, count,
+            count / max(duration, 1e-6),
+        ))
+
+
+class DataGenerator:
+    """
+    Generates rows of every model with a seeded random generator and writes
+     them by batches of bulk_create.
+    """
+
+    def __init__(self, options, ingredient_ids, report):
+        self.options = options
+        self.ingredient_ids = ingredient_ids
+        self.report = report
+        self.random = random.Random(options['seed'])
+
+    def generate(self):
+        """Generate rows of all models."""
+        self.user_ids = self.generate_users()
+        self.tag_ids = self.generate_tags()
+        author_weights = self.get_power_law_weights(len(self.user_ids))
+        self.recipe_ids = self.generate_recipes(author_weights)
+        recipe_weights = self.get_power_law_weights(len(self.recipe_ids))
+        self.create(TagRecipe, self.iter_tag_recipes())
+        self.create(AmountIngredient, self.iter_amount_ingredients())
+        self.create(Favorite, self.iter_linked(
+            Favorite, self.recipe_ids, recipe_weights,
+            self.options['favorites_per_user'],
+        ))
+        self.create(Cart, self.iter_linked(
+            Cart, self.recipe_ids, recipe_weights,
+            self.options['carts_per_user'],
+        ))
+        self.create(Subscription, self.iter_subscriptions(author_weights))
+
+    def create(self, model, objs):
+        """Insert objects by batches and return number of inserted rows."""
+        start = time.perf_counter()
+        count = 0
+        for batch in get_batches(objs, self.options['batch_size']):
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        self.report(model, count, time.perf_counter() - start)
+        return count
+
+    def get_new_ids(self, model, last_pk):
+        """Return primary keys of the model rows created after last_pk."""
+        return list(model.objects.filter(pk__gt=last_pk).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def get_last_pk(self, model):
+        """Return the largest primary key of the model rows."""
+        last = model.objects.order_by('-pk').values_list('pk', flat=True)
+        return last.first() or 0
+
+    def get_power_law_weights(self, count):
+        """
+        Return cumulative weights for a random order of count items, where
+         weight of an item is proportional to its rank ** -exponent.
+        """
+        ranks = list(range(1, count + 1))
+        self.random.shuffle(ranks)
+        exponent = self.options['popularity_exponent']
+        return list(accumulate(rank ** -exponent for rank in ranks))
+
+    def get_count(self, mean, limit):
+        """Return random number of items with exponential distribution."""
+        if mean <= 0:
+            return 0
+        return min(int(self.random.expovariate(1 / mean)), limit)
+
+    def generate_users(self):
+        """Create users with the same password and return their ids."""
+        last_pk = self.get_last_pk(User)
+        first_number = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        password = make_password(self.options['password'])
+        self.create(User, (
+            User(username=f'{USERNAME_PREFIX}{number}',
+                 email=f'{USERNAME_PREFIX}{number}@foodgram.ru',
+                 first_name=USERNAME_PREFIX, last_name=str(number),
+                 password=password)
+            for number in range(first_number,
+                                first_number + self.options['users'])
+        ))
+        return self.get_new_ids(User, last_pk)
+
+    def generate_tags(self):
+        """Create tags up to the set number and return ids of all tags."""
+        first_number = Tag.objects.filter(
+            slug__startswith=USERNAME_PREFIX
+        ).count()
+        colors = set(Tag.objects.values_list('color', flat=True))
+        missing_count = self.options['tags'] - Tag.objects.count()
+        new_colors = []
+        while len(new_colors) < missing_count:
+            color = f'#{self.random.randrange(1 << 24):06x}'
+            if color not in colors:
+                colors.add(color)
+                new_colors.append(color)
+        self.create(Tag, (
+            Tag(name=f'{USERNAME_PREFIX} {number}',
+                slug=f'{USERNAME_PREFIX}-{number}',
+                color=color)
+            for number, color in enumerate(new_colors, first_number)
+        ))
+        return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+    def generate_recipes(self, author_weights):
+        """Create recipes mostly of popular authors and return their ids."""
+        last_pk = self.get_last_pk(Recipe)
+        first_number = Recipe.objects.count()
+        author_ids = self.random.choices(
+            self.user_ids, cum_weights=author_weights,
+            k=self.options['recipes'],
+        )
+        self.create(Recipe, (
+            Recipe(author_id=author_id,
+                   name=f'{USERNAME_PREFIX} recipe {number}',
+                   text=f'{USERNAME_PREFIX} recipe text {number}',
+                   cooking_time=self.random.randint(1, 180),
+                   image=GENERATED_IMAGE)
+            for number, author_id in enumerate(author_ids, first_number)
+        ))
+        return self.get_new_ids(Recipe, last_pk)
+
+    def iter_tag_recipes(self):
+        """Yield random tags of every recipe."""
+        limit = min(self.options['tags_per_recipe'], len(self.tag_ids))
+        for recipe_id in self.recipe_ids:
+            for tag_id in self.random.sample(self.tag_ids,
+                                             self.random.randint(1, limit)):
+                yield TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+
+    def iter_amount_ingredients(self):
+        """Yield random ingredients with amounts of every recipe."""
+        limit = min(self.options['ingredients_per_recipe'],
+                    len(self.ingredient_ids))
+        for recipe_id in self.recipe_ids:
+            for ingredient_id in self.random.sample(
+                    self.ingredient_ids, self.random.randint(1, limit)):
+                yield AmountIngredient(recipe_id=recipe_id,
+                                       ingredient_id=ingredient_id,
+                                       amount=self.random.randint(1, 500))
+
+    def iter_linked(self, model, recipe_ids, cum_weights, mean):
+        """Yield favorites or carts of every user with popular recipes."""
+        for user_id in self.user_ids:
+            count = self.get_count(mean, len(recipe_ids))
+            for recipe_id in set(self.random.choices(
+                    recipe_ids, cum_weights=cum_weights, k=count)):
+                yield model(user_id=user_id, recipe_id=recipe_id)
+
+    def iter_subscriptions(self, author_weights):
+        """Yield subscriptions of every user mostly to popular authors."""
+        for user_id in self.user_ids:
+            count = self.get_count(self.options['subscriptions_per_user'],
+                                   len(self.user_ids) - 1)
+            authors = set(self.random.choices(
+                self.user_ids, cum_weights=author_weights, k=count
+            ))
+            authors.discard(user_id)
+            for author_id in authors:
+                yield Subscription(user_from_id=user_id, user_to_id=author_id)
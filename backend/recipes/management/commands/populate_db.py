@@ -1,53 +1,107 @@
-"""Management command for filling the database with data from a csv-file."""
+"""
+Management command for filling the database with ingredients from a csv or
+json file.
+"""
 
 import csv
 import os
+import time
 
 from django.conf import settings
 from django.core.management import BaseCommand, CommandError
 from django.utils.translation import gettext_lazy as _
 
+from recipes.ingredient_index import ingredient_index
+from recipes.loaders import load_ingredients, read_csv, read_json
 from recipes.models import Ingredient
 
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
 
 class Command(BaseCommand):
-    help = _('Fills Ingredient table from a csv file')
+    help = _('Fills Ingredient table from a csv or json file. Ingredients, '
+             'which are already in the table, are skipped.')
     messages = {
         'prepare_data': _('Looking for a file with data to upload...'),
         'path_to_file': _('The following path is set: '),
         'file_does_not_exist': _('The data file for database does not exist'),
-        'already_loaded_error': _('The data in the table already exists'),
+        'format_error': _('Unknown format of the data file'),
         'loading_data': _('Loading data into the table "Ingredient"'),
         'fields_error': _('Number of fields in the file does not match'),
+        'file_error': _('The data file can not be read: '),
         'success_loading': _('Successful data upload'),
+        'count_rows': _('Rows read - {}, new entities - {}, {:.0f} rows/sec'),
         'count_data': _('Entities in the table after loading - '),
     }
     path = settings.BASE_DIR / 'data/ingredients.csv'
     count_fields = 2  # set how many fields in the table Ingredient
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=self.path,
+            help=_('Path to the csv or json file with ingredients.'),
+        )
+        parser.add_argument(
+            '--format', choices=READERS,
+            help=_('Format of the file, by default it is taken from the '
+                   'file extension.'),
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help=_('Number of rows inserted at once.'),
+        )
+
     def handle(self, *args, **options):
+        path = options['path']
         self.stdout.write(self.messages.get('prepare_data'))
-        self.stdout.write(self.messages.get('path_to_file') + str(self.path))
-        if not os.path.isfile(self.path):
+        self.stdout.write(self.messages.get('path_to_file') + str(path))
+        if not os.path.isfile(path):
             raise CommandError(self.messages.get('file_does_not_exist'))
-        if Ingredient.objects.exists():
-            raise CommandError(self.messages.get('already_loaded_error'))
+        file_format = options['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in READERS:
+            raise CommandError(self.messages.get('format_error'))
 
         self.stdout.write(self.messages.get('loading_data'))
-        ingredients_list = []
-        with open(self.path, encoding='utf-8') as csvfile:
-            ingredient_reader = csv.reader(csvfile, delimiter=',')
-            for row in ingredient_reader:
-                if len(row) != self.count_fields:
-                    raise CommandError(self.messages.get('fields_error'))
-                ingredients_list.append(
-                    Ingredient(name=row[0], measurement_unit=row[1])
+        self.count_rows = 0
+        start = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            try:
+                created = load_ingredients(
+                    self.get_rows(READERS[file_format](file)),
+                    options['batch_size'],
+                )
+            except (ValueError, csv.Error) as error:
+                raise CommandError(
+                    self.messages.get('file_error') + str(error)
                 )
-        Ingredient.objects.bulk_create(ingredients_list)
+        duration = time.perf_counter() - start
+        if created:
+            ingredient_index.invalidate()
 
         self.stdout.write(self.style.SUCCESS(
             self.messages.get('success_loading'))
         )
+        self.stdout.write(self.messages.get('count_rows').format(
+            self.count_rows, created, self.count_rows / max(duration, 1e-6)
+        ))
         self.stdout.write(self.style.SUCCESS(
             self.messages.get('count_data') + str(Ingredient.objects.count()))
         )
+
+    def get_rows(self, records):
+        """
+        Yield (name, measurement_unit) rows from csv rows or json objects
+         and count them.
+        """
+        for record in records:
+            if isinstance(record, dict):
+                record = (record.get('name'), record.get('measurement_unit'))
+            if (not isinstance(record, (list, tuple))
+                    or len(record) != self.count_fields
+                    or not all(isinstance(value, str) for value in record)):
+                raise CommandError(self.messages.get('fields_error'))
+            self.count_rows += 1
+            yield tuple(value.strip() for value in record)
@@ -0,0 +1,45 @@
+"""Management command for checking and rebuilding shopping lists."""
+
+from django.core.management import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+
+from recipes.shopping_list import check_shopping_lists, rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = _('Checks or rebuilds aggregated shopping lists of users')
+    messages = {
+        'checking': _('Checking shopping lists...'),
+        'wrong_user': _('Wrong items in shopping list of user {} - {}'),
+        'wrong_lists': _('Shopping lists are inconsistent'),
+        'lists_ok': _('Shopping lists are consistent'),
+        'rebuilding': _('Rebuilding shopping lists...'),
+        'count_data': _('Items in shopping lists after rebuilding - '),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help=_('Only check shopping lists without rebuilding.'),
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.stdout.write(self.messages.get('checking'))
+            wrong_lists = check_shopping_lists()
+            for user_id, count in sorted(wrong_lists.items()):
+                self.stdout.write(
+                    self.messages.get('wrong_user').format(user_id, count)
+                )
+            if wrong_lists:
+                raise CommandError(self.messages.get('wrong_lists'))
+            self.stdout.write(self.style.SUCCESS(
+                self.messages.get('lists_ok'))
+            )
+            return
+
+        self.stdout.write(self.messages.get('rebuilding'))
+        count = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            self.messages.get('count_data') + str(count))
+        )
@@ -0,0 +1,21 @@
+"""Management command for recounting favorites and cart counters."""
+
+from django.core.management import BaseCommand
+from django.utils.translation import gettext_lazy as _
+
+from recipes.utils import recount_recipe_counters
+
+
+class Command(BaseCommand):
+    help = _('Recounts favorites and shopping cart counters of recipes')
+    messages = {
+        'recounting': _('Recounting counters of recipes...'),
+        'count_fixed': _('Recipes with fixed counters - '),
+    }
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.messages.get('recounting'))
+        fixed = recount_recipe_counters()
+        self.stdout.write(self.style.SUCCESS(
+            self.messages.get('count_fixed') + str(fixed))
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_alter_tag_color'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-pub_date', 'name', 'id'), 'verbose_name': 'recipe', 'verbose_name_plural': 'recipes'},
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', 'name', 'id'], name='recipe_feed_idx'),
+        ),
+    ]
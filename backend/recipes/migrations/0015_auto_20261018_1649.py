@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_auto_20261018_1644'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='recipe image variants'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.HashedFileSystemStorage(), upload_to='recipes/images/', verbose_name='recipe image'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:54
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+# Models linked to ingredient: (model, owner field, amount field).
+LINKED_MODELS = (
+    ('AmountIngredient', 'recipe_id', 'amount'),
+    ('ShoppingListItem', 'user_id', 'total_amount'),
+)
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), count=Count('id')).filter(
+        count__gt=1
+    ).order_by()
+    for group in duplicates:
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit'],
+        ).exclude(pk=group['keep_id']).values_list('pk', flat=True))
+        for model_name, owner_field, amount_field in LINKED_MODELS:
+            model = apps.get_model('recipes', model_name)
+            for obj in model.objects.filter(ingredient__in=duplicate_ids):
+                merged = model.objects.filter(
+                    ingredient_id=group['keep_id'],
+                    **{owner_field: getattr(obj, owner_field)},
+                ).update(**{
+                    amount_field: F(amount_field) + getattr(obj, amount_field)
+                })
+                if merged:
+                    obj.delete()
+                else:
+                    obj.ingredient_id = group['keep_id']
+                    obj.save(update_fields=('ingredient',))
+        Ingredient.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_auto_20261018_1649'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:12
+
+from django.db import migrations
+
+CREATE_TRIGRAM_SQL = '''
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ingredient_name_trgm_idx
+    ON recipes_ingredient USING gin (name gin_trgm_ops);
+'''
+DROP_TRIGRAM_SQL = 'DROP INDEX IF EXISTS ingredient_name_trgm_idx;'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGRAM_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGRAM_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
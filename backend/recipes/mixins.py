@@ -0,0 +1,109 @@
+import hashlib
+import threading
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .caches import get_version
+
+
+class VersionedListMixin:
+    """
+    Mixin for read only viewsets of reference data.
+    The full list is rendered to JSON once per version of the data and then
+     served as bytes with a strong ETag. Requests with a matching
+     If-None-Match header get 304 response without a body. Requests with
+     query parameters are handled as usual.
+    """
+    version_name = None
+    _rendered_lists = {}
+    _lock = threading.Lock()
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        etag, body = self.get_rendered_list()
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (
+            etag in parse_etags(if_none_match) or if_none_match == '*'
+        ):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def get_rendered_list(self):
+        """Return ETag and JSON body of the list for the current version."""
+        version = get_version(self.version_name)
+        rendered = self._rendered_lists.get(self.__class__)
+        if rendered is None or rendered[0] != version:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = self.get_serializer(queryset, many=True).data
+            body = JSONRenderer().render(data)
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            rendered = (version, etag, body)
+            with self._lock:
+                self._rendered_lists[self.__class__] = rendered
+        return rendered[1:]
+
+
+class AnonymousCacheMixin:
+    """
+    Mixin for viewsets caching rendered JSON responses of list and retrieve
+     for anonymous users.
+    Responses are keyed on the action, the object id and the normalized
+     query string, so the same filters in another order share an entry.
+     X-Cache header tells whether the response was taken from the cache.
+    """
+    response_cache = None
+    unordered_query_params = ('tags',)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args,
+                                        **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args,
+                                        **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """Return cached response or call the handler and cache its body."""
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request, kwargs)
+        body = self.response_cache.get(key)
+        cache_status = 'HIT'
+        if body is None:
+            version = self.response_cache.get_version()
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = JSONRenderer().render(response.data)
+            self.response_cache.set(key, body, version)
+            cache_status = 'MISS'
+        response = HttpResponse(body, content_type='application/json')
+        response['X-Cache'] = cache_status
+        return response
+
+    def get_response_cache_key(self, request, kwargs):
+        """
+        Return key of the response. Host is a part of the key, because
+         pagination links are absolute.
+        """
+        params = []
+        for name in sorted(request.query_params):
+            values = request.query_params.getlist(name)
+            if name in self.unordered_query_params:
+                values = sorted(values)
+            params.append((name, values))
+        return (self.action, kwargs.get(self.lookup_url_kwarg
+                                        or self.lookup_field),
+                request.build_absolute_uri('/'),
+                urlencode(params, doseq=True))
@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.utils.translation import gettext_lazy as _
 
+from recipes.storage import HashedFileSystemStorage
 from recipes.validators import HexValidator
 
 User = get_user_model()
@@ -61,11 +65,68 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = _('ingredient')
         verbose_name_plural = _('ingredients')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+def get_recipe_related_lookups():
+    """Return lookups for prefetching author, tags and ingredients."""
+    return (
+        'author',
+        'tags',
+        Prefetch(
+            'amount_ingredients',
+            queryset=AmountIngredient.objects.select_related('ingredient'),
+        ),
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet for Recipe model with methods for preparing data to views."""
+
+    def with_author(self):
+        """
+        Load authors of recipes with a join. Tags and ingredients are loaded
+         by the serializer only for recipes missing in the fragment cache.
+         The search vector is not loaded, it is used by queries only.
+        """
+        return self.defer('search_vector').select_related('author')
+
+    def with_related(self):
+        """
+        Load author, tags and ingredients of recipes in advance, so
+         serializing any number of recipes takes a fixed number of queries.
+        """
+        return self.with_author().prefetch_related(
+            *get_recipe_related_lookups()
+        )
+
+    def first_per_author(self, limit):
+        """
+        Return no more than limit first recipes of every author in the
+         queryset. Recipes are numbered with ROW_NUMBER window partitioned by
+         author, so the whole selection takes one query.
+        """
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('name').asc(), F('id').asc()),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE row_number <= %s ORDER BY row_number',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     """
     Model for recipe.
@@ -99,6 +160,13 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name=_('recipe image'),
         upload_to='recipes/images/',
+        storage=HashedFileSystemStorage(),
+    )
+    image_variants = models.JSONField(
+        verbose_name=_('recipe image variants'),
+        default=dict,
+        blank=True,
+        editable=False,
     )
     text = models.TextField(
         verbose_name=_('recipe description'),
@@ -111,21 +179,52 @@ class Recipe(models.Model):
         verbose_name=_('date of public'),
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name=_('number in favorites'),
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name=_('number in shopping carts'),
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name=_('search vector of name and description'),
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date', 'name')
+        ordering = ('-pub_date', 'name', 'id')
         verbose_name = _('recipe')
         verbose_name_plural = _('recipes')
+        indexes = (
+            models.Index(fields=('-pub_date', 'name', 'id'),
+                         name='recipe_feed_idx'),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', 'name', 'id'),
+                name='recipe_popular_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
-    @property
-    def favorites_counter(self):
-        """Return how many times a recipe has benn added to favorites."""
-        return self.favorites.count()
-
-    favorites_counter.fget.short_description = _('number in favorites')
+    def save(self, *args, update_fields=None, **kwargs):
+        """
+        Save only editable fields of an existing recipe. Counters, image
+         variants and the search vector are changed by queries, so a recipe
+         read before such a query does not write back their old values.
+        """
+        if update_fields is None and not self._state.adding:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if field.editable and not field.primary_key
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 
 
 class AmountIngredient(models.Model):
@@ -256,3 +355,41 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'{self.user}: {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Model for aggregated shopping list of a user.
+    The model stores the total amount of an ingredient from all recipes in
+     the user shopping cart. Rows are changed incrementally when recipes are
+     added to or removed from the cart and when ingredients of recipes in
+     the cart are changed.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name=_('user'),
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name=_('ingredient'),
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE,
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name=_('total amount of ingredient'),
+    )
+
+    class Meta:
+        verbose_name = _('shopping list item')
+        verbose_name_plural = _('shopping list items')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.total_amount}'
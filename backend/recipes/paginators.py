@@ -1,6 +1,105 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomLimitPagination(PageNumberPagination):
-    """Custom pagination class allows set page size from query parameters."""
+    """
+    Custom pagination class allows set page size from query parameters.
+    Without the parameter a page has page_size items, so the whole table is
+     never returned at once.
+    """
+    page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class RecipeKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for the recipe feed.
+    Recipes are ordered by (-pub_date, name, id) and the next page starts
+     right after the last recipe of the previous one, so every page is found
+     by the index without counting rows and scanning the offset. The ordering
+     of the queryset is replaced by the keyset ordering.
+    The position condition is an OR of three comparisons, which the database
+     cannot use as a bound of the index scan, so it is combined with the
+     pub_date__lte range the scan starts from.
+    """
+    ordering = ('-pub_date', 'name', 'id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 10
+    max_page_size = 100
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            pub_date, name, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lte=pub_date),
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, name__gt=name)
+                | Q(pub_date=pub_date, name=name, pk__gt=pk)
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = json.dumps(
+            (last.pub_date.isoformat(), last.name, last.pk),
+            ensure_ascii=False,
+        )
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def decode_cursor(self, request):
+        """Return (pub_date, name, id) position from the cursor or None."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, name, pk = json.loads(
+                base64.urlsafe_b64decode(encoded.encode()).decode()
+            )
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, name, pk
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('results', data),
+        )))
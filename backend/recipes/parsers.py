@@ -0,0 +1,17 @@
+from rest_framework.parsers import FileUploadParser
+
+
+class ImageUploadParser(FileUploadParser):
+    """
+    Parser for an image sent as a raw request body.
+    File is streamed to Django upload handlers. If the file name is not set
+     by Content-Disposition header, it is made from the content type.
+    """
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        filename = super().get_filename(stream, media_type, parser_context)
+        if filename:
+            return filename
+        extension = media_type.split(';')[0].split('/')[-1].strip()
+        return f'{parser_context["request"].user}_recipe.{extension}'
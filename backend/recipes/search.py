@@ -0,0 +1,94 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import (Case, F, Func, IntegerField, Q, TextField, Value,
+                              When)
+
+# Text search configuration of PostgreSQL matching LANGUAGE_CODE.
+SEARCH_CONFIG = 'russian'
+# Rank of a word found in the name and in the text only for other databases.
+NAME_RANK = 2
+TEXT_RANK = 1
+# Name of the case folding function registered for SQLite connections.
+CASEFOLD_FUNCTION = 'foodgram_casefold'
+
+
+class Casefold(Func):
+    """
+    Fold the case of text. SQLite lower() folds ASCII letters only, so
+     SQLite calls str.casefold registered by register_casefold.
+    """
+    function = 'LOWER'
+    output_field = TextField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              function=CASEFOLD_FUNCTION, **extra_context)
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+def register_casefold(sender, connection, **kwargs):
+    """Register the case folding function for a new SQLite connection."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(CASEFOLD_FUNCTION, 1, casefold)
+
+
+def search_recipes(queryset, query):
+    """
+    Filter recipes by the search query in name and text and order them by
+     rank, recipes found by the name go first. PostgreSQL uses the full text
+     search by the indexed search vector, other databases use the fallback.
+    """
+    if not query.split():
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_postgresql(queryset, query)
+    return search_fallback(queryset, query)
+
+
+def search_postgresql(queryset, query):
+    """
+    Search with the web search syntax: words, "quoted phrases", OR and -word
+     are supported. Words are matched by stems.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                               search_type='websearch')
+    return queryset.filter(search_vector=search_query).annotate(
+        search_rank=SearchRank(F('search_vector'), search_query),
+    ).order_by('-search_rank', *queryset.model._meta.ordering)
+
+
+def search_fallback(queryset, query):
+    """
+    Search recipes containing every word of the query in name or text
+     without stemming and case. Rank is the sum of ranks of the words.
+    """
+    queryset = queryset.alias(folded_name=Casefold('name'),
+                              folded_text=Casefold('text'))
+    condition = Q()
+    rank = Value(0, output_field=IntegerField())
+    for word in query.casefold().split():
+        in_name = Q(folded_name__contains=word)
+        condition &= in_name | Q(folded_text__contains=word)
+        rank = rank + Case(
+            When(in_name, then=Value(NAME_RANK)),
+            default=Value(TEXT_RANK),
+            output_field=IntegerField(),
+        )
+    return queryset.filter(condition).annotate(search_rank=rank).order_by(
+        '-search_rank', *queryset.model._meta.ordering
+    )
+
+
+def search_ingredients_trigram(queryset, query, limit):
+    """
+    Return no more than limit ingredients with names similar to the query
+     by pg_trgm similarity, the most similar go first. The similarity
+     condition is served by the trigram index of names.
+    """
+    return queryset.filter(name__trigram_similar=query).annotate(
+        similarity=TrigramSimilarity('name', query),
+    ).order_by('-similarity', 'name', 'id')[:limit]
@@ -1,55 +1,228 @@
 import base64
+import binascii
+import tempfile
+from collections.abc import Mapping
 
 from djoser.conf import settings
 
+from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
-from .models import AmountIngredient, Ingredient, Recipe, Tag
-from .utils import check_unique_ingredient, set_ingredients_to_recipe
+from .fragments import recipe_fragment_cache
+from .images import has_actual_variants
+from .models import AmountIngredient, Ingredient, Recipe, Tag, TagRecipe
+from .shopping_list import change_recipe_in_shopping_lists
+from .utils import (check_unique_ingredient, get_recipes_limit,
+                    set_ingredients_to_recipe, update_recipe_ingredients,
+                    update_recipe_tags)
+from api.timing import TimedSerializerMixin, measure
+from api.viewer_state import get_viewer_state
 from users.serializers import CustomUserSerializer
 
 User = get_user_model()
 
+# Multiple of 4, so every chunk of base64 string is decoded separately.
+BASE64_CHUNK_SIZE = 64 * 1024
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Serializer for recipe image field.
-    Get image from request in base64 encoding and then saves to image file.
+    Get image from request in base64 encoding or as an uploaded file and then
+     saves to image file. Size of the image is limited by the
+     RECIPE_IMAGE_MAX_SIZE setting and is checked before decoding.
     """
+    default_error_messages = {
+        'max_size': _('Image size should not exceed {max_size} bytes.'),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            user = self.context['request'].user
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr),
-                               name=f'{user}_recipe.' + ext)
+            data = self.decode_base64(data)
+        elif getattr(data, 'size', 0) > django_settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('max_size',
+                      max_size=django_settings.RECIPE_IMAGE_MAX_SIZE)
 
         return super().to_internal_value(data)
 
+    def decode_base64(self, data):
+        """
+        Decode base64 image by chunks to a spooled temporary file, which is
+         moved from memory to disk if it is larger than
+         FILE_UPLOAD_MAX_MEMORY_SIZE setting. Whitespace, for example line
+         breaks, is removed first, so every chunk is whole base64 groups.
+        """
+        header_end = data.find(';base64,')
+        if header_end == -1:
+            self.fail('invalid_image')
+        encoded = ''.join(data[header_end + len(';base64,'):].split())
+        size = len(encoded) * 3 // 4
+        if size > django_settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('max_size',
+                      max_size=django_settings.RECIPE_IMAGE_MAX_SIZE)
+
+        ext = data[:header_end].split('/')[-1]
+        file = File(
+            tempfile.SpooledTemporaryFile(
+                max_size=django_settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+            ),
+            name=f'{self.context["request"].user}_recipe.' + ext,
+        )
+        try:
+            for position in range(0, len(encoded), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    encoded[position:position + BASE64_CHUNK_SIZE]
+                ))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only field for URLs of resized variants of recipe image.
+    Returns empty dict until variants of the current image are built.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not has_actual_variants(recipe):
+            return {}
+        storage = recipe.image.storage
+        request = self.context.get('request')
+        representation = {}
+        for variant, names in recipe.image_variants.items():
+            if variant == 'source':
+                continue
+            representation[variant] = {}
+            for file_format, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                representation[variant][file_format] = url
+        return representation
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Many related field loading objects for all values with one query."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        self.child_relation.load_objects(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child_relation.objects = None
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key related field, which can resolve many values with one query.
+    Objects loaded by load_objects method are used instead of a query for
+     every value. Errors for invalid values are the same as for
+     PrimaryKeyRelatedField.
+    """
+    objects = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def load_objects(self, values):
+        """Load objects for all values, which are valid primary keys."""
+        queryset = self.get_queryset()
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except DjangoValidationError:
+                continue
+        self.objects = queryset.in_bulk(pks)
+
+    def to_pk(self, value):
+        """Convert value to the type of primary key of the model."""
+        if isinstance(value, bool):
+            raise DjangoValidationError('Boolean is not a primary key.')
+        return self.get_queryset().model._meta.pk.to_python(value)
+
+    def to_internal_value(self, data):
+        if self.objects is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.objects:
+            self.fail('does_not_exist', pk_value=data)
+        return self.objects[pk]
+
+
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for upload of recipe image only."""
+    image = Base64ImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Tag model."""
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Ingredient model."""
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
+class AmountIngredientListSerializer(serializers.ListSerializer):
+    """
+    List serializer for AmountIngredient model.
+    Loads ingredients for all submitted ids with one query before validation
+     of every item.
+    """
+
+    def to_internal_value(self, data):
+        id_field = self.child.fields['id']
+        if isinstance(data, list):
+            id_field.load_objects(
+                item.get('id') for item in data if isinstance(item, Mapping)
+            )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            id_field.objects = None
+
+
 class AmountIngredientSerializer(serializers.ModelSerializer):
     """
     Serializer for AmountIngredient model.
     Get ingredient id and its amount with POST request for create recipe.
     For GET request return ingredient id, name, amount and measurement unit.
     """
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit',
@@ -58,6 +231,7 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = AmountIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = AmountIngredientListSerializer
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -65,16 +239,32 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
         return data
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    List serializer for Recipe model.
+    Takes representations of all recipes from the fragment cache at once.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        return self.child.represent_many(list(data))
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Recipe model.
     In POST request get ingredient tags, ingredients with amount, name, text
     description, cooking time and image for create new recipe. Ingredients in
     should be unique. For GET request add fields author of the recipe,
-    is_favorited and is_in_shopping_cart.
+    is_favorited and is_in_shopping_cart, which are taken from the viewer
+    state cache. The rest of the representation is taken from the fragment
+    cache. Update compares tags and
+    ingredients with stored ones and writes only the difference in one
+    transaction.
     """
     author = CustomUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -83,6 +273,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -90,57 +281,103 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        data['tags'] = TagSerializer(instance.tags.all(), many=True).data
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        """
+        Return representations of recipes made of cached fragments with
+         relations of the viewer to recipes and their authors.
+        """
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        with measure('serialize'):
+            fragments = recipe_fragment_cache.get_many(
+                recipes, self.to_fragment, base_url
+            )
+            viewer_state = get_viewer_state(self.context)
+            # The cache returns unpickled copies, so fragments are not shared.
+            for recipe, fragment in zip(recipes, fragments):
+                fragment['author']['is_subscribed'] = (
+                    viewer_state.is_subscribed(recipe.author_id)
+                )
+                fragment['is_favorited'] = viewer_state.is_favorited(
+                    recipe.pk
+                )
+                fragment['is_in_shopping_cart'] = (
+                    viewer_state.is_in_shopping_cart(recipe.pk)
+                )
+        return fragments
+
+    def to_fragment(self, recipe):
+        """Return representation of the recipe for the fragment cache."""
+        data = super().to_representation(recipe)
+        data['tags'] = TagSerializer(recipe.tags.all(), many=True).data
         return data
 
     def validate_ingredients(self, value):
         check_unique_ingredient(value)
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('amount_ingredients')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=tag) for tag in tags
+        )
         set_ingredients_to_recipe(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        tags = validated_data.pop('tags', recipe.tags)
-        ingredients = validated_data.pop(
-            'amount_ingredients', recipe.amount_ingredients
-        )
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('amount_ingredients', None)
         for attr, value in validated_data.items():
             setattr(recipe, attr, value)
-        recipe.tags.set(tags)
-        recipe.ingredients.clear()
-        set_ingredients_to_recipe(recipe, ingredients)
         recipe.save()
+        if tags is not None:
+            update_recipe_tags(recipe, tags)
+        if ingredients is not None:
+            old_amounts = update_recipe_ingredients(recipe, ingredients)
+            change_recipe_in_shopping_lists(recipe, old_amounts, {
+                ingredient['id'].pk: ingredient['amount']
+                for ingredient in ingredients
+            })
         return recipe
 
     def get_is_favorited(self, recipe):
-        current_user = self.context['request'].user
-        return current_user.is_authenticated and (
-            current_user.favorites.filter(recipe=recipe).exists()
-        )
+        return get_viewer_state(self.context).is_favorited(recipe.pk)
 
     def get_is_in_shopping_cart(self, recipe):
-        current_user = self.context['request'].user
-        return current_user.is_authenticated and (
-            current_user.cart.filter(recipe=recipe).exists()
-        )
+        return get_viewer_state(self.context).is_in_shopping_cart(recipe.pk)
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for short view info about recipe."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = 'id', 'name', 'image', 'cooking_time'
+        fields = 'id', 'name', 'image', 'image_variants', 'cooking_time'
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Serializer for list of recipe ids for bulk add/del recipes to favorite
+     or shopping cart.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
 
 
 class RecipeSubscriptionSerializer(CustomUserSerializer):
@@ -148,6 +385,8 @@ class RecipeSubscriptionSerializer(CustomUserSerializer):
     Serializer for view subscriptions of the current user.
     Method get_recipes allows limit recipes for views by query parameter
      recipes_limit, get_recipes_count returns  the number of author's recipes.
+    Recipes and their count are taken from recipes_by_author context and
+     recipes_count annotation if the view has loaded them in advance.
     """
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
@@ -163,11 +402,17 @@ class RecipeSubscriptionSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, user):
-        recipes = user.recipes.all()
-        limit = self.context['request'].query_params.get('recipes_limit')
-        if limit is not None and limit.isdigit():
-            recipes = recipes[:int(limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(user.pk, [])
+        else:
+            recipes = user.recipes.all()
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         return ShortRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, user):
+        if hasattr(user, 'recipes_count'):
+            return user.recipes_count
         return user.recipes.count()
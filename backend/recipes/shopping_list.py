@@ -0,0 +1,193 @@
+"""
+Module for maintaining aggregated shopping lists of users.
+
+ShoppingListItem rows hold the total amount of every ingredient from recipes
+in the user shopping cart. They are changed incrementally, so downloading
+the shopping list is a simple indexed read.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import AmountIngredient, Cart, ShoppingListItem
+
+User = get_user_model()
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def lock_users(user_ids):
+    """
+    Lock rows of the users in the order of primary keys. Every change of
+     shopping lists is made under locks of their users, so concurrent
+     changes of one list do not insert the same item twice and changes of
+     several lists do not deadlock.
+    """
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').only('pk'))
+
+
+def change_shopping_lists(changes):
+    """
+    Apply changes of ingredient amounts to shopping lists.
+    changes is a dict {(user_id, ingredient_id): delta}, items whose total
+     amount becomes zero are deleted.
+    """
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+
+    with transaction.atomic():
+        lock_users({user_id for user_id, _ in changes})
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.select_for_update().filter(
+                user__in={user_id for user_id, _ in changes},
+                ingredient__in={ingredient_id for _, ingredient_id in changes},
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in changes.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=delta,
+                    ))
+                continue
+            item.total_amount += delta
+            if item.total_amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ('total_amount',))
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipes_to_shopping_list(user, recipe_ids, sign=1):
+    """Add ingredients of recipes to the shopping list of the user."""
+    amounts = AmountIngredient.objects.filter(
+        recipe__in=recipe_ids
+    ).values('ingredient').annotate(amount=Sum('amount')).order_by()
+    change_shopping_lists({
+        (user.pk, obj['ingredient']): sign * obj['amount'] for obj in amounts
+    })
+
+
+def remove_recipes_from_shopping_list(user, recipe_ids):
+    """Remove ingredients of recipes from the shopping list of the user."""
+    add_recipes_to_shopping_list(user, recipe_ids, sign=-1)
+
+
+def change_recipe_in_shopping_lists(recipe, old_amounts, new_amounts):
+    """
+    Apply changes of recipe ingredients to shopping lists of all users who
+     have the recipe in the cart. old_amounts and new_amounts are dicts
+     {ingredient_id: amount}.
+    """
+    deltas = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    if not any(deltas.values()):
+        return
+    user_ids = Cart.objects.filter(recipe=recipe).values_list('user',
+                                                              flat=True)
+    change_shopping_lists({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items()
+    })
+
+
+def get_recipe_amounts(recipe_ids):
+    """Return dict {recipe_id: {ingredient_id: amount}} of the recipes."""
+    amounts = defaultdict(dict)
+    for recipe_id, ingredient_id, amount in AmountIngredient.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list('recipe', 'ingredient', 'amount'):
+        amounts[recipe_id][ingredient_id] = amount
+    return amounts
+
+
+@contextmanager
+def track_recipe_ingredients(recipe_ids):
+    """
+    Apply changes of ingredients of the recipes made in the block to
+     shopping lists of users who have the recipes in the cart.
+    """
+    recipe_ids = {recipe_id for recipe_id in recipe_ids
+                  if recipe_id is not None}
+    old_amounts = get_recipe_amounts(recipe_ids)
+    yield
+    new_amounts = get_recipe_amounts(recipe_ids)
+    for recipe_id in recipe_ids:
+        change_recipe_in_shopping_lists(recipe_id,
+                                        old_amounts.get(recipe_id, {}),
+                                        new_amounts.get(recipe_id, {}))
+
+
+def remove_recipe_from_shopping_lists(recipe):
+    """Remove ingredients of recipe from shopping lists of all users."""
+    old_amounts = dict(
+        recipe.amount_ingredients.values_list('ingredient', 'amount')
+    )
+    change_recipe_in_shopping_lists(recipe, old_amounts, {})
+
+
+def get_actual_shopping_lists():
+    """
+    Return dict {(user_id, ingredient_id): total_amount} aggregated from
+     recipes in carts of users.
+    """
+    totals = AmountIngredient.objects.filter(
+        recipe__cart__isnull=False
+    ).values('recipe__cart__user', 'ingredient').annotate(
+        total=Sum('amount')
+    ).order_by()
+    return {
+        (obj['recipe__cart__user'], obj['ingredient']): obj['total']
+        for obj in totals.iterator()
+    }
+
+
+def check_shopping_lists():
+    """
+    Compare stored shopping lists with actual ones and return dict of users
+     with the number of wrong items.
+    """
+    actual = get_actual_shopping_lists()
+    stored = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in ShoppingListItem.objects
+        .values_list('user', 'ingredient', 'total_amount').iterator()
+    }
+    wrong_items = defaultdict(int)
+    for key in actual.keys() | stored.keys():
+        if actual.get(key) != stored.get(key):
+            wrong_items[key[0]] += 1
+    return dict(wrong_items)
+
+
+@transaction.atomic
+def rebuild_shopping_lists():
+    """Rebuild all shopping lists and return the number of items."""
+    actual = get_actual_shopping_lists()
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total_amount=total)
+         for (user_id, ingredient_id), total in actual.items()),
+        batch_size=REBUILD_BATCH_SIZE,
+    )
+    return len(actual)
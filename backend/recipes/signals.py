@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caches import TAGS_VERSION, bump_version, recipe_response_cache
+from .fragments import recipe_fragment_cache
+from .images import schedule_image_variants
+from .ingredient_index import ingredient_index
+from .models import AmountIngredient, Ingredient, Recipe, Tag, TagRecipe
+from .shopping_list import remove_recipe_from_shopping_lists
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """
+    Rebuild the ingredient index and drop cached recipes after changes are
+     committed.
+    """
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(recipe_fragment_cache.invalidate_all)
+    transaction.on_commit(recipe_response_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    """Change the version of tags after changes are committed."""
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION))
+    transaction.on_commit(recipe_fragment_cache.invalidate_all)
+    transaction.on_commit(recipe_response_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=AmountIngredient)
+@receiver((post_save, post_delete), sender=TagRecipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    """
+    Drop cached responses and the cached representation of the recipe after
+     changes are committed.
+    """
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(
+        lambda: recipe_fragment_cache.invalidate([recipe_id])
+    )
+    transaction.on_commit(recipe_response_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_author_recipe_responses(instance, created=False,
+                                       update_fields=None, **kwargs):
+    """
+    Drop cached responses and representations of recipes after a profile of
+     an author is changed. Updating of last login time on login is skipped.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    if not created:
+        author_id = instance.pk
+        transaction.on_commit(
+            lambda: recipe_fragment_cache.invalidate_author(author_id)
+        )
+    transaction.on_commit(recipe_response_cache.invalidate)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_shopping_lists(instance, **kwargs):
+    """Remove ingredients of the recipe before it is deleted from carts."""
+    remove_recipe_from_shopping_lists(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(instance, **kwargs):
+    """Build variants of a new recipe image in the background."""
+    schedule_image_variants(instance)
@@ -0,0 +1,44 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    File system storage naming files by a hash of their content.
+    Files are put to subdirectories by the first characters of the hash, so
+     a directory does not grow too large. A file with the same content is not
+     saved again, its existing name is returned instead.
+    """
+    hash_algorithm = 'sha256'
+    shard_levels = 2
+    shard_length = 2
+
+    def get_hashed_name(self, name, content):
+        """Return name of the file made by hash of the content."""
+        file_hash = hashlib.new(self.hash_algorithm)
+        for chunk in content.chunks():
+            file_hash.update(chunk)
+        content.seek(0)
+        digest = file_hash.hexdigest()
+        shards = (
+            digest[level * self.shard_length:(level + 1) * self.shard_length]
+            for level in range(self.shard_levels)
+        )
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name), *shards,
+                            digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
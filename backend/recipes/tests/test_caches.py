@@ -0,0 +1,157 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.caches import recipe_response_cache
+from recipes.ingredient_index import ingredient_index
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag, TagRecipe
+from recipes.tests.utils import (clear_caches, create_ingredients,
+                                 create_recipe, create_user, get_client,
+                                 run_in_another_process)
+
+User = get_user_model()
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class VersionTests(TestCase):
+    """Tests of versions of cached data shared between processes."""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_index_notices_invalidation_in_another_process(self):
+        self.assertEqual(ingredient_index.search('salt'), [])
+        # Bulk creation does not send signals, as in populate_db command.
+        Ingredient.objects.bulk_create(
+            (Ingredient(name='salt', measurement_unit='g'),)
+        )
+        self.assertEqual(ingredient_index.search('salt'), [])
+        run_in_another_process(
+            'from recipes.ingredient_index import ingredient_index; '
+            'ingredient_index.invalidate()'
+        )
+        self.assertEqual(
+            [row['name'] for row in ingredient_index.search('salt')],
+            ['salt'],
+        )
+
+    def test_generated_tags_are_listed(self):
+        create_ingredients('salt')
+        client = get_client()
+        self.assertEqual(client.get('/api/tags/').json(), [])
+        call_command('generate_data', users=2, recipes=2, tags=3,
+                     stdout=StringIO())
+        self.assertEqual(len(client.get('/api/tags/').json()), 3)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class ResponseCacheTests(TestCase):
+    """Tests of cached recipe responses for anonymous users."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.breakfast = Tag.objects.create(name='breakfast', color='#000001',
+                                           slug='breakfast')
+        cls.dinner = Tag.objects.create(name='dinner', color='#000002',
+                                        slug='dinner')
+        cls.salt, = create_ingredients('salt')
+        cls.recipe = create_recipe(cls.author, 'soup', {cls.salt: 5},
+                                   (cls.breakfast,))
+
+    def setUp(self):
+        clear_caches()
+        # Saved recipes are not passed to the image worker pool, its threads
+        # do not see the test transaction.
+        executor = mock.patch('recipes.images.get_executor')
+        executor.start()
+        self.addCleanup(executor.stop)
+        self.client = APIClient()
+        self.detail_url = f'{self.url}{self.recipe.pk}/'
+
+    def get(self, url, params=None, x_cache=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        if x_cache is not None:
+            self.assertEqual(response['X-Cache'], x_cache)
+        return response.json()
+
+    def test_list_and_detail_are_cached(self):
+        hits = recipe_response_cache.hits
+        for url in (self.url, self.detail_url):
+            with self.subTest(url=url):
+                self.get(url, x_cache='MISS')
+                self.get(url, x_cache='HIT')
+        self.assertEqual(recipe_response_cache.hits, hits + 2)
+
+    def test_order_of_tags_does_not_change_key(self):
+        self.get(f'{self.url}?tags=breakfast&tags=dinner', x_cache='MISS')
+        self.get(f'{self.url}?tags=dinner&tags=breakfast', x_cache='HIT')
+        self.get(f'{self.url}?tags=dinner', x_cache='MISS')
+
+    def test_authenticated_responses_are_not_cached(self):
+        client = get_client(self.author)
+        for _ in range(2):
+            self.assertNotIn('X-Cache', client.get(self.url))
+
+    def test_changes_drop_responses_after_commit(self):
+        changes = {
+            'recipe': lambda: Recipe.objects.get(pk=self.recipe.pk).save(),
+            'ingredients': lambda: AmountIngredient.objects.get(
+                recipe=self.recipe
+            ).save(),
+            'tags': lambda: TagRecipe.objects.create(recipe=self.recipe,
+                                                     tag=self.dinner),
+            'author': lambda: User.objects.get(pk=self.author.pk).save(),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                self.get(self.url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                    self.get(self.url, x_cache='HIT')
+                self.get(self.url, x_cache='MISS')
+
+    def test_responses_show_committed_changes(self):
+        self.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipe.pk).get().delete()
+        self.get(self.url, x_cache='MISS')
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, 'new soup')
+            self.author.first_name = 'new name'
+            self.author.save()
+        data = self.get(f'{self.url}{recipe.pk}/', x_cache='MISS')
+        self.assertEqual(data['name'], 'new soup')
+        self.assertEqual(data['author']['first_name'], 'new name')
+
+    def test_rolled_back_change_keeps_responses(self):
+        self.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Recipe.objects.filter(pk=self.recipe.pk).update(
+                        name='rolled back'
+                    )
+                    Recipe.objects.get(pk=self.recipe.pk).save()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        data = self.get(self.url, x_cache='HIT')
+        self.assertEqual(data['results'][0]['name'], 'soup')
+
+    def test_login_keeps_responses(self):
+        self.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=['last_login'])
+        self.get(self.url, x_cache='HIT')
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Cart, Favorite
+from recipes.tests.utils import (clear_caches, create_recipe, create_user,
+                                 get_client)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class LinkedRecipeFilterTests(TestCase):
+    """Tests of is_favorited and is_in_shopping_cart filters of recipes."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.other_user = create_user('other')
+        cls.recipes = [create_recipe(cls.other_user, f'recipe {i}')
+                       for i in range(5)]
+        for recipe in cls.recipes[:3]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        Favorite.objects.create(user=cls.other_user, recipe=cls.recipes[4])
+        Cart.objects.create(user=cls.user, recipe=cls.recipes[3])
+
+    def setUp(self):
+        clear_caches()
+        self.client = get_client(self.user)
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def assert_filtered(self):
+        self.assertEqual(self.get_ids({'is_favorited': 1}),
+                         {recipe.pk for recipe in self.recipes[:3]})
+        self.assertEqual(self.get_ids({'is_in_shopping_cart': 1}),
+                         {self.recipes[3].pk})
+        self.assertEqual(len(self.get_ids({'is_favorited': 0})), 5)
+
+    def test_small_sets_are_filtered_by_cached_ids(self):
+        self.assert_filtered()
+
+    @mock.patch('recipes.filters.LINKED_IDS_LIMIT', 1)
+    def test_large_sets_are_filtered_by_subquery(self):
+        self.assert_filtered()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_ids({'is_favorited': 1})
+        table = Favorite._meta.db_table
+        self.assertTrue(any(
+            'EXISTS' in query['sql'] and table in query['sql']
+            for query in queries.captured_queries
+        ))
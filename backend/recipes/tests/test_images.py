@@ -0,0 +1,155 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from recipes.images import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_SIZES,
+                            build_image_variants,
+                            build_image_variants_in_worker)
+from recipes.models import Recipe
+from recipes.serializers import Base64ImageField
+from recipes.tests.utils import (clear_caches, create_recipe, create_user,
+                                 get_client)
+
+
+class ImageSerializer(serializers.Serializer):
+    image = Base64ImageField()
+
+
+def get_png(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+    """Tests of decoding images sent as base64 data URLs."""
+
+    def decode(self, data):
+        serializer = ImageSerializer(data={'image': data}, context={
+            'request': SimpleNamespace(user='user'),
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.validated_data['image']
+
+    @mock.patch('recipes.serializers.BASE64_CHUNK_SIZE', 16)
+    def test_base64_with_line_breaks_is_decoded(self):
+        content = get_png()
+        encoded = base64.encodebytes(content).decode()
+        self.assertIn('\n', encoded)
+        for data in (encoded, encoded.replace('\n', '\r\n'),
+                     encoded.replace('\n', ' ')):
+            with self.subTest(data=data[:80]):
+                file = self.decode(f'data:image/png;base64,{data}')
+                self.assertEqual(file.read(), content)
+                self.assertEqual(file.size, len(content))
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class ImageVariantTests(TestCase):
+    """Tests of content-addressed recipe images and their variants."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        clear_caches()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.content = get_png((800, 600))
+
+    def upload(self, content):
+        response = get_client(self.author).put(
+            f'/api/recipes/{self.recipe.pk}/image/',
+            {'image': SimpleUploadedFile('photo.png', content,
+                                         'image/png')},
+        )
+        self.assertEqual(response.status_code, 200)
+        return Recipe.objects.get(pk=self.recipe.pk)
+
+    def test_same_content_is_stored_once_by_hash(self):
+        storage = Recipe._meta.get_field('image').storage
+        digest = hashlib.sha256(self.content).hexdigest()
+        names = [storage.save(f'recipes/images/{name}.PNG',
+                              ContentFile(self.content))
+                 for name in ('first', 'second')]
+        self.assertEqual(names, [
+            f'recipes/images/{digest[:2]}/{digest[2:4]}/{digest}.png'
+        ] * 2)
+        self.assertEqual(
+            len(storage.listdir(os.path.dirname(names[0]))[1]), 1
+        )
+
+    def test_variants_are_built_after_commit_and_served(self):
+        client = APIClient()
+        url = f'/api/recipes/{self.recipe.pk}/'
+        executor = mock.Mock()
+        with mock.patch('recipes.images.get_executor', return_value=executor):
+            with self.captureOnCommitCallbacks() as callbacks:
+                recipe = self.upload(self.content)
+            executor.submit.assert_not_called()
+            for callback in callbacks:
+                callback()
+        # The worker runs in another thread with its own connection, which
+        # does not see the test transaction, so it is called directly.
+        executor.submit.assert_called_once_with(
+            build_image_variants_in_worker, recipe.pk
+        )
+        self.assertEqual(client.get(url).json()['image_variants'], {})
+
+        self.assertTrue(build_image_variants(recipe.pk))
+        recipe.refresh_from_db()
+        storage = recipe.image.storage
+        for variant, (width, height) in IMAGE_VARIANT_SIZES.items():
+            for file_format in IMAGE_VARIANT_FORMATS:
+                with self.subTest(variant=variant, file_format=file_format):
+                    name = recipe.image_variants[variant][file_format]
+                    with storage.open(name) as file, Image.open(file) as image:
+                        self.assertLessEqual(image.width, width)
+                        self.assertLessEqual(image.height, height)
+                        self.assertEqual(image.format, file_format.upper())
+        variants = client.get(url).json()['image_variants']
+        self.assertEqual(set(variants), set(IMAGE_VARIANT_SIZES))
+        self.assertTrue(
+            variants['card']['webp'].startswith('http://testserver/media/')
+        )
+        response = get_client(self.user).post(f'{url}favorite/')
+        self.assertEqual(response.json()['image_variants'], variants)
+        self.assertFalse(build_image_variants(recipe.pk))
+
+    def test_variants_of_replaced_image_are_not_served(self):
+        recipe = self.upload(self.content)
+        build_image_variants(recipe.pk)
+        recipe = self.upload(get_png((300, 200)))
+        response = APIClient().get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.json()['image_variants'], {})
+
+    def test_rolled_back_upload_does_not_build_variants(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    self.upload(self.content)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).image.name,
+                         self.recipe.image.name)
@@ -0,0 +1,84 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from recipes.paginators import CustomLimitPagination
+
+User = get_user_model()
+
+
+def create_recipes(author, count):
+    """
+    Create recipes with repeated publication dates and names, so a cursor
+     has to compare every part of the position.
+    """
+    pub_date = timezone.make_aware(datetime.datetime(2022, 1, 1))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'recipe {i % 3}', text='text',
+               cooking_time=10, image='recipes/images/test.jpg')
+        for i in range(count)
+    )
+    for i, recipe in enumerate(Recipe.objects.order_by('pk')):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            pub_date=pub_date - datetime.timedelta(days=i % 4)
+        )
+    return recipes
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class RecipePaginationTests(TestCase):
+    """Tests of page sizes and cursors of the recipe list."""
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password=None,
+            first_name='author', last_name='author',
+        )
+        create_recipes(cls.author, 15)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+
+    def test_default_page_size_without_limit(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 15)
+        self.assertEqual(len(data['results']),
+                         CustomLimitPagination.page_size)
+        self.assertIsNotNone(data['next'])
+
+    def test_limit_is_capped(self):
+        create_recipes(self.author, CustomLimitPagination.max_page_size)
+        response = self.client.get(self.url, {'limit': 1000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']),
+                         CustomLimitPagination.max_page_size)
+
+    def test_cursor_pages_follow_feed_ordering(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', 'name', 'id'
+        ).values_list('id', flat=True))
+        ids = []
+        url = f'{self.url}?pagination=cursor&limit=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url = data['next']
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url,
+                                   {'pagination': 'cursor', 'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from recipes.models import Favorite, Recipe
+from recipes.serializers import RecipeSerializer
+from recipes.tests.utils import (clear_caches, create_recipe, create_user,
+                                 get_client)
+from recipes.utils import change_recipe_counter
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class RecipeUpdateTests(TestCase):
+    """Tests of columns written by saving an edited recipe."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        clear_caches()
+
+    def favorite(self):
+        """Add the recipe to favorites as the favorite endpoint does."""
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        change_recipe_counter((self.recipe.pk,), Favorite, 1)
+
+    def test_patch_keeps_counter_changed_after_recipe_is_read(self):
+        validate = RecipeSerializer.validate
+
+        def favorite_while_validating(serializer, attrs):
+            self.favorite()
+            return validate(serializer, attrs)
+
+        with mock.patch.object(RecipeSerializer, 'validate',
+                               favorite_while_validating):
+            response = get_client(self.author).patch(
+                f'/api/recipes/{self.recipe.pk}/', {'name': 'new name'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'new name')
+        self.assertEqual(recipe.favorites_count, 1)
+
+        response = get_client(self.user).delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).favorites_count, 0
+        )
+
+    def test_save_of_read_recipe_keeps_fields_changed_by_queries(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.favorite()
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_variants={'source': recipe.image.name}
+        )
+        recipe.name = 'new name'
+        recipe.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'new name')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_variants,
+                         {'source': recipe.image.name})
@@ -0,0 +1,106 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Tag
+from recipes.tests.utils import clear_caches
+
+TAGS_URL = '/api/tags/'
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class ReferenceDataTests(TestCase):
+    """Tests of tag and ingredient lists served pre-rendered with ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='breakfast', color='#000001',
+                                     slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(name='salt',
+                                                   measurement_unit='g')
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def get_names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()], response['ETag']
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.client.get(TAGS_URL)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        for if_none_match in (etag, f'"other", {etag}', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get(
+                    TAGS_URL, HTTP_IF_NONE_MATCH=if_none_match
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+        response = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_tag_change_changes_list_after_commit(self):
+        names, etag = self.get_names(TAGS_URL)
+        self.assertEqual(names, ['breakfast'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=self.tag.pk).get().delete()
+            Tag.objects.create(name='dinner', color='#000002', slug='dinner')
+        names, new_etag = self.get_names(TAGS_URL)
+        self.assertEqual(names, ['dinner'])
+        self.assertNotEqual(new_etag, etag)
+        response = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rolled_back_tag_change_keeps_list(self):
+        names, etag = self.get_names(TAGS_URL)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Tag.objects.create(name='dinner', color='#000002',
+                                       slug='dinner')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.get_names(TAGS_URL), (names, etag))
+
+    def test_ingredient_change_changes_list_after_commit(self):
+        etag = self.get_names(INGREDIENTS_URL)[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = 'sea salt'
+            self.ingredient.save()
+        names, new_etag = self.get_names(INGREDIENTS_URL)
+        self.assertEqual(names, ['sea salt'])
+        self.assertNotEqual(new_etag, etag)
+        response = self.client.get(INGREDIENTS_URL, {'name': 'sea'})
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['sea salt'])
+
+    def test_populate_db_changes_ingredient_list(self):
+        names, etag = self.get_names(INGREDIENTS_URL)
+        self.assertEqual(names, ['salt'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ingredients.csv')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('salt,g\nflour,g\n')
+            call_command('populate_db', path, stdout=StringIO())
+        names, new_etag = self.get_names(INGREDIENTS_URL)
+        self.assertCountEqual(names, ['salt', 'flour'])
+        self.assertNotEqual(new_etag, etag)
+
+    def test_query_parameters_are_not_pre_rendered(self):
+        response = self.client.get(INGREDIENTS_URL, {'name': 'sa'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual([item['name'] for item in response.json()],
+                         ['salt'])
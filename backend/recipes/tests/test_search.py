@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from recipes.search import search_fallback, search_recipes
+
+User = get_user_model()
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class SearchFallbackTests(TestCase):
+    """Tests of the recipe search used by databases other than PostgreSQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password=None,
+            first_name='author', last_name='author',
+        )
+        recipes = {
+            'soup': ('Borscht with beef', 'Beetroot, cabbage and beef.'),
+            'salad': ('Salad', 'Served with borscht and sour cream.'),
+            'stew': ('Stewed beef', 'Stew for two hours.'),
+            'pie': ('Cabbage pie with beef', 'Bake for an hour.'),
+            'shchi': ('Щи из квашеной капусты', 'Капуста, говядина и Укроп.'),
+        }
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=name, text=text, cooking_time=10,
+                   image='recipes/images/test.jpg',
+                   favorites_count=favorites_count)
+            for favorites_count, (name, text) in enumerate(recipes.values())
+        )
+        cls.recipes = {
+            key: Recipe.objects.get(name=name)
+            for key, (name, _) in recipes.items()
+        }
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def search(self, query):
+        return [recipe.pk for recipe in search_fallback(
+            Recipe.objects.all(), query
+        )]
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('beetroot cabbage'),
+                         [self.recipes['soup'].pk])
+        self.assertEqual(self.search('beef salad'), [])
+
+    def test_words_are_matched_case_insensitive_in_name_and_text(self):
+        self.assertCountEqual(
+            self.search('CABBAGE'),
+            [self.recipes['soup'].pk, self.recipes['pie'].pk],
+        )
+
+    def test_cyrillic_words_are_matched_case_insensitive(self):
+        for query in ('ЩИ', 'капуста', 'УКРОП говядина', 'Квашеной'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query),
+                                 [self.recipes['shchi'].pk])
+
+    def test_name_match_ranks_above_text_match(self):
+        self.assertEqual(
+            self.search('borscht'),
+            [self.recipes['soup'].pk, self.recipes['salad'].pk],
+        )
+
+    def test_rank_is_sum_of_word_ranks(self):
+        self.assertEqual(
+            self.search('beef cabbage'),
+            [self.recipes['pie'].pk, self.recipes['soup'].pk],
+        )
+
+    def test_blank_query_does_not_filter(self):
+        queryset = Recipe.objects.all()
+        for query in ('', '   ', '\t\n'):
+            with self.subTest(query=query):
+                self.assertIs(search_recipes(queryset, query), queryset)
+
+    def test_api_search_orders_by_rank(self):
+        response = APIClient().get('/api/recipes/', {'search': 'borscht'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.recipes['soup'].pk, self.recipes['salad'].pk],
+        )
+
+    def test_api_ordering_overrides_rank(self):
+        response = APIClient().get(
+            '/api/recipes/', {'search': 'borscht', 'ordering': 'popular'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.recipes['salad'].pk, self.recipes['soup'].pk],
+        )
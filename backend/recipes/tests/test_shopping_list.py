@@ -0,0 +1,153 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Cart, ShoppingListItem
+from recipes.shopping_list import change_shopping_lists, check_shopping_lists
+from recipes.tests.utils import (clear_caches, create_ingredients,
+                                 create_recipe, create_user, get_client)
+from recipes.utils import apply_linked_recipes_change, get_linked_recipe_ids
+
+User = get_user_model()
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class ShoppingListTests(TestCase):
+    """Tests of aggregated shopping lists of users."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.salt, cls.flour, cls.egg = create_ingredients('salt', 'flour',
+                                                          'egg')
+        cls.bread = create_recipe(cls.author, 'bread',
+                                  {cls.salt: 5, cls.flour: 500})
+        cls.pie = create_recipe(cls.author, 'pie',
+                                {cls.flour: 300, cls.egg: 2})
+
+    def setUp(self):
+        clear_caches()
+
+    def get_shopping_list(self, user):
+        return dict(ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient', 'total_amount'
+        ))
+
+    def test_users_are_locked_in_order_before_items_are_read(self):
+        Cart.objects.create(user=self.user, recipe=self.bread)
+        Cart.objects.create(user=self.author, recipe=self.bread)
+        user_table = User._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            change_shopping_lists({
+                (self.user.pk, self.salt.pk): 5,
+                (self.author.pk, self.salt.pk): 5,
+            })
+        sql = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, query in enumerate(sql) if user_table in query)
+        self.assertIn(f'ORDER BY "{user_table}"."id" ASC', sql[lock])
+        self.assertTrue(all(ShoppingListItem._meta.db_table not in query
+                            for query in sql[:lock]))
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.salt.pk: 5})
+        self.assertEqual(self.get_shopping_list(self.author),
+                         {self.salt.pk: 5})
+
+    def test_cart_endpoints_change_shopping_list(self):
+        client = get_client(self.user)
+        client.post(f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        client.post(f'/api/recipes/{self.pie.pk}/shopping_cart/')
+        self.assertEqual(self.get_shopping_list(self.user), {
+            self.salt.pk: 5, self.flour.pk: 800, self.egg.pk: 2,
+        })
+        client.delete(f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.flour.pk: 300, self.egg.pk: 2})
+
+    def test_bulk_endpoints_change_shopping_list(self):
+        client = get_client(self.user)
+        url = '/api/recipes/shopping_cart/'
+        ids = [self.bread.pk, self.pie.pk]
+        client.post(url, {'recipes': ids}, format='json')
+        client.post(url, {'recipes': ids}, format='json')
+        self.assertEqual(self.get_shopping_list(self.user), {
+            self.salt.pk: 5, self.flour.pk: 800, self.egg.pk: 2,
+        })
+        client.delete(url, {'recipes': [self.pie.pk]}, format='json')
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.salt.pk: 5, self.flour.pk: 500})
+        self.assertEqual(check_shopping_lists(), {})
+
+    def test_patch_of_recipe_changes_shopping_lists_of_all_users(self):
+        for user in (self.user, self.author):
+            get_client(user).post(
+                f'/api/recipes/{self.bread.pk}/shopping_cart/'
+            )
+        get_client(self.user).post(
+            f'/api/recipes/{self.pie.pk}/shopping_cart/'
+        )
+        response = get_client(self.author).patch(
+            f'/api/recipes/{self.bread.pk}/',
+            {'ingredients': [{'id': self.flour.pk, 'amount': 400},
+                             {'id': self.egg.pk, 'amount': 1}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.flour.pk: 700, self.egg.pk: 3})
+        self.assertEqual(self.get_shopping_list(self.author),
+                         {self.flour.pk: 400, self.egg.pk: 1})
+        self.assertEqual(check_shopping_lists(), {})
+
+    def test_deleted_recipe_leaves_shopping_lists(self):
+        client = get_client(self.user)
+        client.post(f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        client.post(f'/api/recipes/{self.pie.pk}/shopping_cart/')
+        response = get_client(self.author).delete(
+            f'/api/recipes/{self.pie.pk}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.salt.pk: 5, self.flour.pk: 500})
+        self.assertEqual(check_shopping_lists(), {})
+
+    def test_carts_changed_in_admin_change_shopping_list(self):
+        Cart.objects.create(user=self.user, recipe=self.bread)
+        apply_linked_recipes_change(self.user, Cart, set(),
+                                    get_linked_recipe_ids(self.user, Cart))
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.salt.pk: 5, self.flour.pk: 500})
+        old_ids = get_linked_recipe_ids(self.user, Cart)
+        Cart.objects.filter(user=self.user).update(recipe=self.pie)
+        apply_linked_recipes_change(self.user, Cart, old_ids,
+                                    get_linked_recipe_ids(self.user, Cart))
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.flour.pk: 300, self.egg.pk: 2})
+        self.assertEqual(check_shopping_lists(), {})
+
+    def test_download_reads_shopping_list(self):
+        client = get_client(self.user)
+        client.post(f'/api/recipes/{self.bread.pk}/shopping_cart/')
+        client.post(f'/api/recipes/{self.pie.pk}/shopping_cart/')
+        response = client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        for line in ('egg - 2 g', 'flour - 800 g', 'salt - 5 g'):
+            self.assertIn(line, content)
+
+    def test_command_checks_and_rebuilds_shopping_lists(self):
+        Cart.objects.bulk_create(
+            (Cart(user=self.user, recipe=self.bread),)
+        )
+        self.assertEqual(check_shopping_lists(), {self.user.pk: 2})
+        with self.assertRaises(CommandError):
+            call_command('rebuild_shopping_lists', check=True,
+                         stdout=StringIO())
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.get_shopping_list(self.user),
+                         {self.salt.pk: 5, self.flour.pk: 500})
+        call_command('rebuild_shopping_lists', check=True, stdout=StringIO())
@@ -0,0 +1,66 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import AmountIngredient, Ingredient, Recipe, TagRecipe
+
+User = get_user_model()
+
+
+def clear_caches():
+    """Clear every cache, on_commit callbacks do not run in TestCase."""
+    for cache in caches.all():
+        cache.clear()
+
+
+def run_in_another_process(code):
+    """Run python code in a separate process as a management command does."""
+    subprocess.run(
+        (sys.executable, 'manage.py', 'shell', '-c', code),
+        cwd=settings.BASE_DIR, check=True, capture_output=True,
+    )
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru', password=None,
+        first_name=username, last_name=username,
+    )
+
+
+def create_ingredients(*names):
+    return [Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in names]
+
+
+def create_recipe(author, name='recipe', ingredients=None, tags=()):
+    """
+    Create a recipe with ingredients given as {ingredient: amount} and
+     tags.
+    """
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='text', cooking_time=10,
+        image='recipes/images/test.jpg',
+    )
+    AmountIngredient.objects.bulk_create(
+        AmountIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in (ingredients or {}).items()
+    )
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe, tag=tag) for tag in tags
+    )
+    return recipe
+
+
+def get_client(user=None):
+    """Return API client authenticated by a token of the user."""
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
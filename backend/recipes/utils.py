@@ -1,14 +1,37 @@
+import csv
 import datetime
+import io
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from .models import AmountIngredient
+from .models import (AmountIngredient, Cart, Favorite, Recipe,
+                     ShoppingListItem, TagRecipe)
+from .shopping_list import (add_recipes_to_shopping_list, lock_users,
+                            remove_recipes_from_shopping_list)
+from api.viewer_state import viewer_state_cache
+
+SHOPPING_LIST_CHUNK_SIZE = 8192
+SHOPPING_LIST_CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+LINKED_MODEL_COUNTERS = {
+    Favorite: 'favorites_count',
+    Cart: 'cart_count',
+}
+# Outcomes of bulk add/del of recipes to linked model for every recipe id.
+BULK_ADDED = 'added'
+BULK_ALREADY_ADDED = 'already_added'
+BULK_REMOVED = 'removed'
+BULK_NOT_ADDED = 'not_added'
+BULK_NOT_FOUND = 'not_found'
 
 
 def check_unique_ingredient(ingredients):
@@ -20,6 +43,31 @@ def check_unique_ingredient(ingredients):
         )
 
 
+def get_recipes_limit(request):
+    """Return recipes_limit query parameter as int or None if it is not set."""
+    limit = request.query_params.get('recipes_limit')
+    if limit is not None and limit.isdigit():
+        return int(limit)
+    return None
+
+
+def get_recipes_by_author(authors, limit=None):
+    """
+    Return dict with a list of recipes for every author. If limit is set,
+     no more than limit first recipes are returned for each author.
+    """
+    recipes = Recipe.objects.filter(author__in=authors).only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time', 'author'
+    )
+    if limit is not None:
+        recipes = recipes.first_per_author(limit)
+
+    recipes_by_author = {author.pk: [] for author in authors}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
 def set_ingredients_to_recipe(recipe, ingredients):
     """Set ingredients to recipe for POST and PATCH methods."""
     objs = []
@@ -30,10 +78,130 @@ def set_ingredients_to_recipe(recipe, ingredients):
     AmountIngredient.objects.bulk_create(objs)
 
 
+def update_recipe_tags(recipe, tags):
+    """
+    Update tags of recipe for PATCH method. Only links to removed tags are
+     deleted and only links to new tags are created.
+    """
+    old_tag_ids = {tag.pk for tag in recipe.tags.all()}
+    new_tag_ids = {tag.pk for tag in tags}
+    if old_tag_ids - new_tag_ids:
+        TagRecipe.objects.filter(
+            recipe=recipe, tag__in=old_tag_ids - new_tag_ids
+        ).delete()
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe, tag_id=tag_id)
+        for tag_id in new_tag_ids - old_tag_ids
+    )
+
+
+def update_recipe_ingredients(recipe, ingredients):
+    """
+    Update ingredients of recipe for PATCH method. Only changed amounts are
+     updated, removed ingredients are deleted and new ones are created.
+     Return dict {ingredient_id: amount} of ingredients before the update.
+    """
+    objs = {obj.ingredient_id: obj for obj in recipe.amount_ingredients.all()}
+    old_amounts = {
+        ingredient_id: obj.amount for ingredient_id, obj in objs.items()
+    }
+    new_amounts = {
+        ingredient['id'].pk: ingredient['amount'] for ingredient in ingredients
+    }
+    if old_amounts.keys() - new_amounts.keys():
+        AmountIngredient.objects.filter(
+            recipe=recipe,
+            ingredient__in=old_amounts.keys() - new_amounts.keys(),
+        ).delete()
+    changed_objs = []
+    for ingredient_id, amount in new_amounts.items():
+        obj = objs.get(ingredient_id)
+        if obj is not None and obj.amount != amount:
+            obj.amount = amount
+            changed_objs.append(obj)
+    if changed_objs:
+        AmountIngredient.objects.bulk_update(changed_objs, ('amount',))
+    AmountIngredient.objects.bulk_create(
+        AmountIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                         amount=amount)
+        for ingredient_id, amount in new_amounts.items()
+        if ingredient_id not in objs
+    )
+    return old_amounts
+
+
+def change_recipe_counter(recipe_ids, linked_model, delta):
+    """Change the counter of the linked model for recipes by delta."""
+    field = LINKED_MODEL_COUNTERS[linked_model]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: F(field) + delta}
+    )
+
+
+def get_linked_recipe_ids(user, linked_model):
+    """Return set of ids of recipes linked to the user by linked model."""
+    return set(linked_model.objects.filter(user=user).values_list(
+        'recipe', flat=True
+    ))
+
+
+def apply_linked_recipes_change(user, linked_model, old_ids, new_ids):
+    """
+    Change counters of recipes, the viewer state and the shopping list of
+     the user after recipes linked to the user are changed not through the
+     API, for example, in the admin site.
+    """
+    added, removed = new_ids - old_ids, old_ids - new_ids
+    if added:
+        change_recipe_counter(added, linked_model, 1)
+    if removed:
+        change_recipe_counter(removed, linked_model, -1)
+    viewer_state_cache.invalidate(linked_model, (user.pk,))
+    if linked_model is Cart:
+        if added:
+            add_recipes_to_shopping_list(user, added)
+        if removed:
+            remove_recipes_from_shopping_list(user, removed)
+
+
+def recount_recipe_counters():
+    """
+    Recount favorites and cart counters of all recipes from linked models
+     and return the number of recipes whose counters have been fixed.
+    """
+    actual_counts = {
+        field: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe').annotate(count=Count('pk')).values('count')
+        ), 0)
+        for model, field in LINKED_MODEL_COUNTERS.items()
+    }
+    mismatch = Q()
+    for field in actual_counts:
+        mismatch |= ~Q(**{field: F(f'actual_{field}')})
+    wrong_recipes = Recipe.objects.annotate(**{
+        f'actual_{field}': count for field, count in actual_counts.items()
+    }).filter(mismatch).values('pk')
+    return Recipe.objects.filter(pk__in=wrong_recipes).update(
+        **actual_counts
+    )
+
+
 def add_recipe_to_linked_model(recipe, linked_model, user, serializer):
-    """Add recipe to linked model, for example, favorite or cart."""
-    obj, created = linked_model.objects.get_or_create(user=user,
-                                                      recipe=recipe)
+    """
+    Add recipe to linked model, for example, favorite or cart. The user row
+     is locked first, as in bulk changes, so the shopping list is changed
+     by one request at a time.
+    """
+    with transaction.atomic():
+        lock_users((user.pk,))
+        obj, created = linked_model.objects.get_or_create(user=user,
+                                                          recipe=recipe)
+        if created:
+            change_recipe_counter((recipe.pk,), linked_model, 1)
+            viewer_state_cache.invalidate(linked_model, (user.pk,))
+            if linked_model is Cart:
+                add_recipes_to_shopping_list(user, (recipe.pk,))
     if not created:
         raise ValidationError(
             {'errors': _('You have already added this recipe.')}
@@ -43,38 +211,147 @@ def add_recipe_to_linked_model(recipe, linked_model, user, serializer):
 
 
 def del_recipe_from_linked_model(recipe, linked_model, user):
-    """Del recipe from linked model, for example, favorite or cart."""
-    try:
-        obj = linked_model.objects.get(user=user, recipe=recipe)
-    except ObjectDoesNotExist:
+    """
+    Del recipe from linked model, for example, favorite or cart. Counters
+     and the shopping list are changed only if a row was actually deleted,
+     so concurrent requests do not change them twice. The user row is
+     locked first, as in bulk changes.
+    """
+    with transaction.atomic():
+        lock_users((user.pk,))
+        deleted = linked_model.objects.filter(
+            user=user, recipe=recipe
+        ).delete()[0]
+        if deleted:
+            change_recipe_counter((recipe.pk,), linked_model, -1)
+            viewer_state_cache.invalidate(linked_model, (user.pk,))
+            if linked_model is Cart:
+                remove_recipes_from_shopping_list(user, (recipe.pk,))
+    if not deleted:
         raise ValidationError(
             {'errors': _('You did not add this recipe.')}
         )
-    obj.delete()
 
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-def get_data_for_shopping_list(user):
-    """Return txt file with shopping list for currents user."""
-    ingredients = AmountIngredient.objects.filter(recipe__cart__user=user)
-    shopping_list = ingredients.values(
-        'ingredient__name',
-        'ingredient__measurement_unit'
-    ).annotate(amount=Sum('amount')).order_by('ingredient__name')
+def bulk_add_recipes_to_linked_model(recipe_ids, linked_model, user):
+    """
+    Add recipes to linked model, for example, favorite or cart, with one
+     insert. Return response with outcome for every recipe id.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        lock_users((user.pk,))
+        found_ids = set(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', flat=True
+        ))
+        linked_ids = set(linked_model.objects.filter(
+            user=user, recipe__in=found_ids
+        ).values_list('recipe', flat=True))
+        new_ids = found_ids - linked_ids
+        linked_model.objects.bulk_create(
+            (linked_model(user=user, recipe_id=recipe_id)
+             for recipe_id in new_ids),
+            ignore_conflicts=True,
+        )
+        if new_ids:
+            change_recipe_counter(new_ids, linked_model, 1)
+            viewer_state_cache.invalidate(linked_model, (user.pk,))
+            if linked_model is Cart:
+                add_recipes_to_shopping_list(user, new_ids)
+
+    return Response(data={'recipes': [
+        {'id': recipe_id,
+         'status': (BULK_NOT_FOUND if recipe_id not in found_ids
+                    else BULK_ALREADY_ADDED if recipe_id in linked_ids
+                    else BULK_ADDED)}
+        for recipe_id in recipe_ids
+    ]})
+
+
+def bulk_del_recipes_from_linked_model(recipe_ids, linked_model, user):
+    """
+    Del recipes from linked model, for example, favorite or cart, with one
+     delete. Return response with outcome for every recipe id.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        lock_users((user.pk,))
+        linked = linked_model.objects.filter(user=user, recipe__in=recipe_ids)
+        linked_ids = set(linked.values_list('recipe', flat=True))
+        if linked_ids:
+            linked.filter(recipe__in=linked_ids).delete()
+            change_recipe_counter(linked_ids, linked_model, -1)
+            viewer_state_cache.invalidate(linked_model, (user.pk,))
+            if linked_model is Cart:
+                remove_recipes_from_shopping_list(user, linked_ids)
+    found_ids = linked_ids | set(Recipe.objects.filter(
+        pk__in=set(recipe_ids) - linked_ids
+    ).values_list('pk', flat=True))
+
+    return Response(data={'recipes': [
+        {'id': recipe_id,
+         'status': (BULK_NOT_FOUND if recipe_id not in found_ids
+                    else BULK_REMOVED if recipe_id in linked_ids
+                    else BULK_NOT_ADDED)}
+        for recipe_id in recipe_ids
+    ]})
 
+
+def get_data_for_shopping_list(user, file_format='txt'):
+    """
+    Return streaming response with shopping list file for currents user.
+    Supported formats are txt and csv. Items are read from the aggregated
+     shopping list of the user.
+    """
+    if file_format not in SHOPPING_LIST_CONTENT_TYPES:
+        file_format = 'txt'
     today = datetime.date.today().strftime('%d_%m_%Y')
-    content = (
-        _('Shopping list for {} - {}\n\n').format(user.get_full_name(), today)
-    )
-    content += '\n'.join(
-        (f'{obj.get("ingredient__name")} - '
-         f'{obj.get("amount")} {obj.get("ingredient__measurement_unit")}'
-         ) for obj in shopping_list
+    filename = f'{user}_shopping_list_{today}.{file_format}'
+    response = StreamingHttpResponse(
+        iter_shopping_list(user, today, file_format),
+        content_type=SHOPPING_LIST_CONTENT_TYPES[file_format],
     )
-    filename = f'{user}_shopping_list_{today}.txt'
-    response = HttpResponse(content,
-                            content_type='text.txt; charset=utf-8')
     response['Content-Disposition'] = f'attachment; filename={filename}'
 
     return response
+
+
+def iter_shopping_list(user, today, file_format):
+    """
+    Yield encoded chunks of shopping list file. Rows are read from the
+     database with iterator and written to one reused buffer.
+    """
+    shopping_list = ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        amount=F('total_amount'),
+    ).order_by('ingredient__name')
+
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow((_('ingredient name'), _('amount of ingredients'),
+                         _('ingredient measurement measure')))
+
+        def write_row(obj):
+            writer.writerow((obj.get('ingredient__name'), obj.get('amount'),
+                             obj.get('ingredient__measurement_unit')))
+    else:
+        buffer.write(_('Shopping list for {} - {}\n\n').format(
+            user.get_full_name(), today
+        ))
+
+        def write_row(obj):
+            buffer.write(f'{obj.get("ingredient__name")} - '
+                         f'{obj.get("amount")} '
+                         f'{obj.get("ingredient__measurement_unit")}\n')
+
+    for obj in shopping_list.iterator():
+        write_row(obj)
+        if buffer.tell() >= SHOPPING_LIST_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
@@ -1,47 +1,80 @@
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
+from .caches import INGREDIENTS_VERSION, TAGS_VERSION, recipe_response_cache
+from .exceptions import RequestEntityTooLarge
 from .filters import IngredientFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .mixins import AnonymousCacheMixin, VersionedListMixin
 from .models import Cart, Favorite, Ingredient, Recipe, Tag
-from .paginators import CustomLimitPagination
+from .paginators import CustomLimitPagination, RecipeKeysetPagination
+from .parsers import ImageUploadParser
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeSerializer,
+from .renderers import CSVRenderer, PlainTextRenderer
+from .serializers import (IngredientSerializer, RecipeIdsSerializer,
+                          RecipeImageSerializer, RecipeSerializer,
                           ShortRecipeSerializer, TagSerializer)
-from .utils import (add_recipe_to_linked_model, del_recipe_from_linked_model,
-                    get_data_for_shopping_list)
+from .utils import (add_recipe_to_linked_model,
+                    bulk_add_recipes_to_linked_model,
+                    bulk_del_recipes_from_linked_model,
+                    del_recipe_from_linked_model, get_data_for_shopping_list)
 
+FUZZY_VALUES = ('true', 'True', '1')
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for model Tag.
-    Read only mode.
+    Read only mode. The list is served pre-rendered with ETag.
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    version_name = TAGS_VERSION
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for model Ingredient.
-    Read only mode. Allow filters ingredient by name.
+    Read only mode. Allow filters ingredient by name. Search by the name
+     prefix is served from the in-memory ingredient index, the full list is
+     served pre-rendered with ETag. Query parameter fuzzy=true adds
+     ingredients with similar names to tolerate typos.
     """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    version_name = INGREDIENTS_VERSION
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is not None:
+            if request.query_params.get('fuzzy') in FUZZY_VALUES:
+                return Response(ingredient_index.search_fuzzy(name))
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet for model Recipe.
     Supports methods GET, POST, PATCH, DELETE. Allow filters recipe by tags,
      field is_favorited and is_in_shopping_cart. Add action methods for add/del
-     recipe to favorite list and shopping cart. Add action method for download
-     shopping list for current user.
+     recipe to favorite list and shopping cart, also for a list of recipes at
+     once. Add action method for download
+     shopping list for current user. Query parameter pagination=cursor
+     switches the list to keyset pagination for infinite scroll. Recipe image
+     may be uploaded as a file by PUT method on the image action. Responses
+     of list and retrieve for anonymous users are cached until recipes
+     change.
     """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
@@ -50,9 +83,31 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomLimitPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    response_cache = recipe_response_cache
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = RecipeKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.with_author()
+        if self.action in ('create', 'partial_update'):
+            return Recipe.objects.with_related()
+        return super().get_queryset()
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
 
     @action(detail=True,
             methods=['post', 'delete'],
@@ -95,7 +150,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
             linked_model=Cart,
         )
 
-    @action(detail=False, permission_classes=(IsAuthenticated,))
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='favorite',
+            url_name='favorite-bulk',
+            permission_classes=(IsAuthenticated,),
+            serializer_class=RecipeIdsSerializer)
+    def favorite_bulk(self, request):
+        """Action method for add/del list of recipes to favorite."""
+        return self.change_linked_model_bulk(request, Favorite)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='shopping_cart',
+            url_name='shopping-cart-bulk',
+            permission_classes=(IsAuthenticated,),
+            serializer_class=RecipeIdsSerializer)
+    def shopping_cart_bulk(self, request):
+        """Action method for add/del list of recipes to shopping cart."""
+        return self.change_linked_model_bulk(request, Cart)
+
+    def change_linked_model_bulk(self, request, linked_model):
+        """Add or del recipes from request data to linked model."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if request.method == 'POST':
+            return bulk_add_recipes_to_linked_model(
+                recipe_ids=serializer.validated_data['recipes'],
+                linked_model=linked_model,
+                user=request.user,
+            )
+        return bulk_del_recipes_from_linked_model(
+            recipe_ids=serializer.validated_data['recipes'],
+            linked_model=linked_model,
+            user=request.user,
+        )
+
+    @action(detail=True,
+            methods=['put'],
+            http_method_names=('put',),
+            parser_classes=(MultiPartParser, ImageUploadParser),
+            serializer_class=RecipeImageSerializer)
+    def image(self, request, pk=None):
+        """
+        Action method for upload recipe image in multipart/form-data image
+         field or as a raw request body with image content type.
+        """
+        recipe = self.get_object()
+        content_length = request.META.get('CONTENT_LENGTH')
+        if (content_length and content_length.isdigit()
+                and int(content_length) > settings.RECIPE_IMAGE_MAX_SIZE):
+            raise RequestEntityTooLarge
+        serializer = self.get_serializer(
+            recipe,
+            data={'image': request.data.get('image',
+                                            request.data.get('file'))},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @action(detail=False,
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(JSONRenderer, PlainTextRenderer, CSVRenderer))
     def download_shopping_cart(self, request):
-        """Method for download shopping list in a txt file."""
-        return get_data_for_shopping_list(user=request.user)
+        """
+        Method for download shopping list in a txt or csv file. The format is
+         set by format query parameter or Accept header, txt by default.
+        """
+        return get_data_for_shopping_list(
+            user=request.user,
+            file_format=request.accepted_renderer.format,
+        )
@@ -4,7 +4,9 @@ from django.contrib.auth.models import Group
 from rest_framework.authtoken.models import TokenProxy
 
 from .models import CustomTokenProxy, Subscription
+from api.viewer_state import viewer_state_cache
 from recipes.models import Cart, Favorite
+from recipes.utils import apply_linked_recipes_change, get_linked_recipe_ids
 
 User = get_user_model()
 
@@ -30,6 +32,16 @@ class UserAdmin(admin.ModelAdmin):
     list_editable = ('username', 'email', 'first_name', 'last_name')
     inlines = (CartInline, FavoriteInline)
 
+    def save_related(self, request, form, formsets, change):
+        user = form.instance
+        old_ids = {model: get_linked_recipe_ids(user, model)
+                   for model in (Cart, Favorite)}
+        super().save_related(request, form, formsets, change)
+        for model, ids in old_ids.items():
+            apply_linked_recipes_change(
+                user, model, ids, get_linked_recipe_ids(user, model)
+            )
+
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -37,6 +49,21 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_filter = ('user_from', 'user_to')
     list_editable = ('user_from', 'user_to')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        viewer_state_cache.invalidate(
+            Subscription, (obj.user_from_id, form.initial.get('user_from'))
+        )
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        viewer_state_cache.invalidate(Subscription, (obj.user_from_id,))
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_from', flat=True))
+        super().delete_queryset(request, queryset)
+        viewer_state_cache.invalidate(Subscription, user_ids)
+
 
 @admin.register(CustomTokenProxy)
 class SubscriptionAdmin(admin.ModelAdmin):
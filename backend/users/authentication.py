@@ -0,0 +1,66 @@
+"""Module for authentication classes used in the Users application."""
+
+import copy
+import hashlib
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.caches import (LocalCache, bump_version, get_version,
+                            is_shared_cache)
+
+
+class TokenCache(LocalCache):
+    """
+    Bounded in-process cache of token to user lookups with time to live.
+    Every token has its own version in the shared cache, so a token deleted
+     or a user deactivated in any process is revoked in all workers, while
+     entries of other tokens are kept. Without a shared cache tokens are not
+     cached, because revocation would not reach other processes.
+    """
+    name = 'token'
+    version_template = 'token:{}'
+
+    def get_version_name(self, key):
+        # Keys are hashed, so tokens can not be read from the shared cache.
+        return self.version_template.format(
+            hashlib.sha256(key.encode()).hexdigest()
+        )
+
+    def get_version(self, key=None):
+        return get_version(self.get_version_name(key))
+
+    def revoke(self, keys):
+        """Drop cached tokens with the keys in all workers."""
+        for key in keys:
+            bump_version(self.get_version_name(key))
+
+    @property
+    def enabled(self):
+        """Check that the cache of versions is shared between processes."""
+        return is_shared_cache()
+
+
+token_cache = TokenCache(max_size=settings.TOKEN_CACHE_MAX_SIZE,
+                         ttl=settings.TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps token to user lookups in the in-process
+     token cache, so authenticated requests do not query the token table.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is None:
+            # The version is taken before the lookup, so a token revoked
+            # during the lookup is not cached.
+            version = token_cache.get_version(key)
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, version)
+        user, token = cached
+        # Views may change request.user, so each request gets its own copy.
+        return copy.copy(user), token
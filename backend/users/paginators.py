@@ -2,5 +2,11 @@ from rest_framework.pagination import PageNumberPagination
 
 
 class CustomLimitPagination(PageNumberPagination):
-    """Custom pagination class allows set page size from query parameters."""
+    """
+    Custom pagination class allows set page size from query parameters.
+    Without the parameter a page has page_size items, so the whole table is
+     never returned at once.
+    """
+    page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
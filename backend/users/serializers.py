@@ -4,13 +4,17 @@ from djoser.serializers import UserSerializer
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from api.timing import TimedSerializerMixin
+from api.viewer_state import get_viewer_state
+
 User = get_user_model()
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     """
     Serializer for User model.
-    Add method for check subscription to another user.
+    Add method for check subscription to another user. Subscriptions of the
+     current user are taken from the viewer state cache.
     """
     is_subscribed = serializers.SerializerMethodField()
 
@@ -23,7 +27,4 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, user_to):
-        user_from = self.context['request'].user
-        return user_from.is_authenticated and user_from != user_to and (
-            user_from.following.filter(pk=user_to.pk).exists()
-        )
+        return get_viewer_state(self.context).is_subscribed(user_to.pk)
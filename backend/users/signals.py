@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .models import CustomTokenProxy
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=CustomTokenProxy)
+def revoke_deleted_token(instance, **kwargs):
+    """Revoke the cached token after logout or deletion of the token."""
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.revoke((key,)))
+
+
+@receiver(post_save, sender=User)
+def revoke_user_tokens(instance, created=False, update_fields=None,
+                       **kwargs):
+    """
+    Revoke cached tokens of a user after the user is changed, e.g.
+     deactivated or their password is changed. New users have no tokens and
+     updating of last login time on login is skipped.
+    """
+    if created or (
+            update_fields is not None and set(update_fields) == {'last_login'}
+    ):
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
+    if keys:
+        transaction.on_commit(lambda: token_cache.revoke(keys))
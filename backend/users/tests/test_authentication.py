@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.tests.utils import (clear_caches, create_user, get_client,
+                                 run_in_another_process)
+from users.authentication import token_cache
+
+ME_URL = '/api/users/me/'
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class TokenCacheTests(TestCase):
+    """Tests of caching and revocation of authentication tokens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.other_user = create_user('other')
+
+    def setUp(self):
+        clear_caches()
+        self.client = get_client(self.user)
+        self.other_client = get_client(self.other_user)
+
+    def assert_cached(self, client):
+        hits = token_cache.hits
+        self.assertEqual(client.get(ME_URL).status_code, 200)
+        self.assertEqual(token_cache.hits, hits + 1)
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        self.assert_cached(self.client)
+
+    def test_revocation_in_another_process_reaches_worker(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        key = Token.objects.get(user=self.user).key
+        # Deleting the token in the test database is invisible to another
+        # process, so the row is deleted here and revoked there.
+        Token.objects.filter(key=key).update(key='revoked')
+        run_in_another_process(
+            'from users.authentication import token_cache; '
+            f'token_cache.revoke(["{key}"])'
+        )
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_logout_revokes_only_own_token(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        self.assertEqual(self.other_client.get(ME_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+        self.assert_cached(self.other_client)
+
+    def test_deactivation_revokes_tokens_of_the_user(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        self.assertEqual(self.other_client.get(ME_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+        self.assert_cached(self.other_client)
+
+    def test_password_change_revokes_old_token(self):
+        self.user.set_password('old-password-1')
+        self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'old-password-1',
+                'new_password': 'new-password-2',
+            })
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_rolled_back_deletion_keeps_cached_token(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Token.objects.filter(user=self.user).delete()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assert_cached(self.client)
+
+    def test_signup_keeps_cached_tokens(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_user('new')
+        self.assert_cached(self.client)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'objects': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'objects',
+        },
+    })
+    def test_tokens_are_not_cached_without_shared_cache(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        hits, misses = token_cache.hits, token_cache.misses
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        self.assertEqual((token_cache.hits, token_cache.misses),
+                         (hits, misses))
+        Token.objects.filter(user=self.user).update(key='revoked')
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
@@ -7,6 +7,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from .models import Subscription
+from api.viewer_state import viewer_state_cache
 
 
 def add_subscribe_to_user(user_from, user_to, serializer):
@@ -24,6 +25,7 @@ def add_subscribe_to_user(user_from, user_to, serializer):
         raise ValidationError(
             {'errors': _('You have already subscribed to this user.')}
         )
+    viewer_state_cache.invalidate(Subscription, (user_from.pk,))
 
     return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
@@ -39,4 +41,5 @@ def del_subscribe_to_user(user_from, user_to):
         )
 
     subscription.delete()
+    viewer_state_cache.invalidate(Subscription, (user_from.pk,))
     return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,7 @@
 from djoser.views import UserViewSet
 
 from django.contrib.auth import get_user_model
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -10,6 +11,7 @@ from .paginators import CustomLimitPagination
 from .serializers import CustomUserSerializer
 from .utils import add_subscribe_to_user, del_subscribe_to_user
 from recipes.serializers import RecipeSubscriptionSerializer
+from recipes.utils import get_recipes_by_author, get_recipes_limit
 
 User = get_user_model()
 
@@ -38,14 +40,25 @@ class CustomUserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,),
             serializer_class=RecipeSubscriptionSerializer)
     def subscriptions(self, request):
+        """
+        Action method for view authors the current user is subscribed to.
+        Recipes of all authors on the page are loaded with one query and
+         passed to the serializer through the context.
+        """
         current_user = self.get_instance()
-        subscriptions = current_user.following.all()
+        subscriptions = current_user.following.annotate(
+            recipes_count=Count('recipes'),
+        ).order_by(*User._meta.ordering)
 
         page = self.paginate_queryset(subscriptions)
+        authors = list(subscriptions) if page is None else page
+        context = self.get_serializer_context()
+        context['recipes_by_author'] = get_recipes_by_author(
+            authors, limit=get_recipes_limit(request)
+        )
+        serializer = self.get_serializer(authors, many=True, context=context)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(subscriptions, many=True)
         return Response(serializer.data)
 
     @action(detail=True,